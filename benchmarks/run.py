@@ -0,0 +1,155 @@
+"""
+Time and memory-profile pyvyu operations on synthetic spreadsheets.
+
+    python -m benchmarks.run                     # compare against baseline.json
+    python -m benchmarks.run --save              # record a new baseline
+    python -m benchmarks.run --scales small --ops load_opf to_df
+
+Each operation is timed as the best of --repeat runs, then run once more
+under tracemalloc for its peak allocation. The exit status is 1 if any
+time or peak grows past --tolerance times its baseline.
+"""
+
+import argparse
+import copy
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pyvyu as pv
+from .synthetic import generate, write
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+SCALES = {
+    "small": dict(columns=4, cells=1000),
+    "medium": dict(columns=4, cells=10000),
+    "large": dict(columns=8, cells=25000, overlap=0.05),
+}
+
+# Points looked up per cells_at / values_at measurement
+PROBES = 1000
+
+
+def _cases(sheet, files):
+    """Operation name -> (setup, run); setup's result is passed to run untimed."""
+
+    names = sheet.get_column_list()
+    stop = max(int(sheet.get_column(n).index.arrays()[1].max()) for n in names)
+    probes = np.random.RandomState(0).randint(0, stop, size=PROBES).tolist()
+
+    def fresh():
+        return (copy.deepcopy(sheet),)
+
+    return {
+        "load_opf": (tuple, lambda: pv.load_opf(files["opf"])),
+        "load_json": (tuple, lambda: pv.load_json(files["json"])),
+        # A fresh copy per run, so no serialized text is kept from the last one
+        "save_opf": (fresh, lambda s: pv.save_opf(s, files["out.opf"], True)),
+        "save_json": (fresh, lambda s: pv.save_json(s, files["out.json"])),
+        "merge_columns": (tuple, lambda: sheet.merge_columns("merged", *names)),
+        "to_df": (tuple, lambda: sheet.to_df()),
+        "trim_sheet": (fresh, lambda s: pv.trim_sheet(stop // 4, stop // 2, s, True, False)),
+        "cells_at": (tuple, lambda: [sheet.cells_at(t) for t in probes]),
+        "values_at": (tuple, lambda: [sheet.values_at(t) for t in probes]),
+    }
+
+
+def measure(setup, run, repeat=3):
+    """Best wall time in seconds and tracemalloc peak in MB of run(*setup())."""
+
+    best = float("inf")
+    for _ in range(repeat):
+        args = setup()
+        gc.collect()
+        start = time.perf_counter()
+        run(*args)
+        best = min(best, time.perf_counter() - start)
+
+    args = setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": round(best, 4), "peak_mb": round(peak / 1e6, 2)}
+
+
+def run_scale(scale, ops=None, repeat=3, backend="cells", log=print):
+    """Measure ops (default: all) on the sheet of one of SCALES."""
+
+    sheet = generate(backend=backend, **SCALES[scale])
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        files = {ext: os.path.join(tmp, f"{scale}.{ext}") for ext in ("opf", "json", "out.opf", "out.json")}
+        write(sheet, files["opf"])
+        write(sheet, files["json"])
+        for op, (setup, run) in _cases(sheet, files).items():
+            if ops is not None and op not in ops:
+                continue
+            results[op] = measure(setup, run, repeat)
+            log(f"{scale:>8} {op:<14} {results[op]['seconds']:9.4f} s {results[op]['peak_mb']:9.2f} MB")
+    return results
+
+
+def compare(results, baseline, tolerance=1.5):
+    """Lines describing every measurement worse than tolerance times its baseline."""
+
+    regressions = []
+    for scale, ops in results.items():
+        for op, current in ops.items():
+            before = baseline.get(scale, {}).get(op)
+            if before is None:
+                continue
+            for key in ("seconds", "peak_mb"):
+                # Ignore noise in measurements too small to matter
+                floor = 0.01 if key == "seconds" else 1.0
+                if current[key] > tolerance * max(before[key], floor):
+                    regressions.append(f"{scale} {op} {key}: {before[key]} -> {current[key]}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="pyvyu benchmarks")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=list(SCALES))
+    parser.add_argument("--ops", nargs="+", default=None)
+    parser.add_argument("--backend", choices=["cells", "arrays"], default="cells")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    args = parser.parse_args(argv)
+
+    results = {s: run_scale(s, args.ops, args.repeat, args.backend) for s in args.scales}
+
+    if args.save:
+        stored = {"python": platform.python_version(), "backend": args.backend, "results": results}
+        with open(args.baseline, "w") as f:
+            json.dump(stored, f, indent=4)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save to record one")
+        return 0
+
+    with open(args.baseline) as f:
+        stored = json.load(f)
+    if stored.get("backend", "cells") != args.backend:
+        print(f"Baseline was recorded for the {stored['backend']} backend")
+        return 0
+
+    regressions = compare(results, stored["results"], args.tolerance)
+    for line in regressions:
+        print("REGRESSION", line)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
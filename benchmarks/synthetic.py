@@ -0,0 +1,68 @@
+import numpy as np
+import pyvyu as pv
+from pyvyu.spreadsheet.Spreadsheet import Spreadsheet
+
+
+def generate(
+    columns=4,
+    cells=1000,
+    codes=2,
+    cardinality=10,
+    point_ratio=0.1,
+    overlap=0.0,
+    mean_ms=2000,
+    seed=0,
+    backend="cells",
+):
+    """
+    Build a random Spreadsheet for benchmarking.
+
+    Each of the columns gets cells cells with codes codes, whose values are
+    drawn from cardinality distinct strings. A point_ratio share of cells
+    have onset == offset, and an overlap share start inside the previous
+    cell of their column instead of after it. Durations and gaps average
+    mean_ms. The same arguments always build the same sheet.
+    """
+
+    if not 0 <= point_ratio <= 1 or not 0 <= overlap <= 1:
+        raise AttributeError("point_ratio and overlap must lie in [0, 1]")
+
+    rng = np.random.RandomState(seed)
+    sheet = Spreadsheet(backend)
+    vocab = np.array([f"v{k}" for k in range(max(cardinality, 1))], dtype=object)
+    for i in range(columns):
+        durations = rng.randint(1, 2 * mean_ms, size=cells)
+        durations[rng.rand(cells) < point_ratio] = 0
+        gaps = rng.randint(1, 2 * mean_ms, size=cells)
+
+        onsets = np.zeros(cells, dtype=np.int64)
+        offsets = np.zeros(cells, dtype=np.int64)
+        inside = rng.rand(cells) < overlap
+        previous_onset, previous_offset = 0, -1
+        for j in range(cells):
+            if inside[j] and j > 0:
+                onset = previous_onset + (previous_offset - previous_onset) // 2
+            else:
+                onset = previous_offset + gaps[j]
+            onsets[j] = onset
+            offsets[j] = onset + durations[j]
+            previous_onset, previous_offset = onset, max(previous_offset, offsets[j])
+
+        col = sheet.new_column(f"column{i}", *[f"code{k}" for k in range(codes)])
+        col.extend(
+            onsets,
+            offsets,
+            {code: vocab[rng.randint(0, len(vocab), size=cells)] for code in col.codelist},
+        )
+    return sheet
+
+
+def write(sheet, filename):
+    """Save sheet as .opf or .json, going by the extension of filename."""
+
+    if filename.endswith(".opf"):
+        pv.save_opf(sheet, filename, True)
+    elif filename.endswith(".json"):
+        pv.save_json(sheet, filename)
+    else:
+        raise AttributeError(f"Unknown spreadsheet format: {filename}")
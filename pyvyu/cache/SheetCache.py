@@ -0,0 +1,197 @@
+import hashlib
+import json
+import logging as log
+import os
+import struct
+import tempfile
+import zipfile
+import numpy as np
+from .. import pyvyu as pv
+from ..spreadsheet.Spreadsheet import Spreadsheet
+
+
+class SheetCache:
+    """
+    On-disk cache of parsed spreadsheets.
+
+    Each entry is a single file holding a JSON header followed by the raw
+    column arrays (ordinals, onsets, offsets and dictionary-encoded codes),
+    which are memory-mapped back on a hit. Entries are keyed on the file
+    path plus either its mtime and size (key="stat") or a hash of its
+    content (key="content", the CRC of the db member for .opf files).
+    Least recently used entries are evicted once the cache grows past
+    max_bytes.
+    """
+
+    _magic = b"PYVYUC1\n"
+    _suffix = ".pvc"
+
+    def __init__(self, directory, max_bytes=1 << 30, key="stat"):
+        if key not in ("stat", "content"):
+            raise AttributeError(f"Unknown cache key: {key}")
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.key = key
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+        }
+
+    def clear(self):
+        for path, _, _ in self._entries():
+            os.remove(path)
+
+    def load(self, filename, loader, backend="cells", columns=None, window=None, shift=True):
+        """
+        Return the sheet for filename from the cache, parsing it with
+        loader(filename, backend) and storing it first on a miss.
+        """
+
+        entry = self._entry_path(filename)
+        try:
+            sheet = self.read(entry, backend, columns, window, shift)
+        except FileNotFoundError:
+            sheet = None
+        except (ValueError, KeyError, OSError) as e:
+            log.warning("Discarding unreadable cache entry %s: %r", entry, e)
+            sheet = None
+
+        if sheet is not None:
+            self.hits += 1
+            os.utime(entry)  # mark as recently used
+            return sheet
+
+        self.misses += 1
+        self.write(entry, loader(filename, "arrays"))
+        sheet = self.read(entry, backend, columns, window, shift)
+        self._evict()
+        return sheet
+
+    def write(self, entry, sheet):
+        """Store sheet in the entry file, replacing it atomically."""
+
+        header = {"columns": []}
+        arrays = []
+        position = 0
+        for col in sheet.columns.values():
+            ordinals, onsets, offsets, codes = col._columnar()
+            fields = {"ordinal": ordinals, "onset": onsets, "offset": offsets}
+            fields.update({f"code:{c}": codes[c][0] for c in col.codelist})
+
+            layout = {}
+            for field, arr in fields.items():
+                arr = np.ascontiguousarray(arr)
+                layout[field] = [position, arr.dtype.str]
+                arrays.append(arr)
+                position += _aligned(arr.nbytes)
+
+            header["columns"].append(
+                {
+                    "name": col.name,
+                    "codes": col.codelist,
+                    "size": len(ordinals),
+                    "layout": layout,
+                    "vocab": {c: codes[c][1] for c in col.codelist},
+                }
+            )
+
+        header = json.dumps(header).encode("utf8")
+        fd, tmpname = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, "wb") as f:
+            f.write(self._magic)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            f.write(b"\0" * (_aligned(f.tell()) - f.tell()))
+            for arr in arrays:
+                f.write(arr.tobytes())
+                f.write(b"\0" * (_aligned(arr.nbytes) - arr.nbytes))
+        os.replace(tmpname, entry)
+
+    def read(self, entry, backend="cells", columns=None, window=None, shift=True):
+        """Rebuild a sheet from an entry file, mapping its arrays copy-on-write."""
+
+        with open(entry, "rb") as f:
+            if f.read(len(self._magic)) != self._magic:
+                raise ValueError("not a pyvyu cache entry")
+            (length,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(length).decode("utf8"))
+        base = _aligned(len(self._magic) + 8 + length)
+        buffer = None
+        if os.path.getsize(entry) > base:
+            buffer = np.memmap(entry, dtype=np.uint8, mode="c")
+
+        def field(meta, name):
+            offset, dtype = meta["layout"][name]
+            dtype = np.dtype(dtype)
+            if meta["size"] == 0:
+                return np.zeros(0, dtype=dtype)
+            start = base + offset
+            return buffer[start : start + meta["size"] * dtype.itemsize].view(dtype)
+
+        sheet = Spreadsheet(backend)
+        for meta in header["columns"]:
+            if columns is not None and meta["name"] not in columns:
+                continue
+
+            ordinals = field(meta, "ordinal")
+            onsets = field(meta, "onset")
+            offsets = field(meta, "offset")
+            codes = {c: (field(meta, f"code:{c}"), meta["vocab"][c]) for c in meta["codes"]}
+            if window is not None:
+                keep, onsets, offsets = pv._apply_window(onsets, offsets, window, shift)
+                ordinals = ordinals[keep]
+                codes = {c: (keys[keep], vocab) for c, (keys, vocab) in codes.items()}
+
+            col = sheet.new_column(meta["name"], *meta["codes"])
+            col._adopt(ordinals, onsets, offsets, codes)
+        return sheet
+
+    def _entry_path(self, filename):
+        path = os.path.abspath(filename)
+        if self.key == "stat":
+            st = os.stat(path)
+            token = f"{st.st_mtime_ns}:{st.st_size}"
+        elif zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as zf:
+                info = zf.getinfo("db")
+                token = f"{info.CRC}:{info.file_size}"
+        else:
+            with open(path, "rb") as f:
+                token = hashlib.sha1(f.read()).hexdigest()
+
+        digest = hashlib.sha1(f"{path}|{token}".encode("utf8")).hexdigest()
+        return os.path.join(self.directory, digest + self._suffix)
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(self._suffix):
+                path = os.path.join(self.directory, name)
+                st = os.stat(path)
+                entries.append((path, st.st_size, st.st_mtime_ns))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            self.evictions += 1
+
+
+def _aligned(n, alignment=8):
+    return (n + alignment - 1) // alignment * alignment
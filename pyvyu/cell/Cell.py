@@ -1,15 +1,42 @@
+from collections.abc import MutableMapping
 from .. import pyvyu as pv
 
 
 class Cell:
-    """Representation of a Datavyu annotation."""
+    """
+    Representation of a Datavyu annotation.
+
+    Code values are stored in a list ordered like the parent column's
+    codelist and located through the column's shared code-to-slot map, so
+    cells carry no dict of their own. The values attribute is a mapping
+    view onto that list.
+    """
+
+    __slots__ = ("_parent", "_ordinal", "_seq", "_onset", "_offset", "_values")
 
     def __init__(self, parent=None, ordinal=0, onset=0, offset=0):
         self._parent = parent
         self._ordinal = ordinal
+        self._seq = None  # insertion order, assigned by the parent's index
         self.onset = pv.to_millis(onset)
         self.offset = pv.to_millis(offset)
-        self.values = {} if parent is None else {k: "" for k in parent.codelist}
+        self._values = [""] * len(self._slots())
+
+    @classmethod
+    def _from_parsed(cls, parent, ordinal, onset, offset, values):
+        """Build a cell from already converted data, skipping validation."""
+
+        c = cls.__new__(cls)
+        c._parent = parent
+        c._ordinal = ordinal
+        c._seq = None
+        c._onset = onset
+        c._offset = offset
+        c._values = values
+        return c
+
+    def _slots(self):
+        return _NO_CODES if self._parent is None else self._parent._slots
 
     def __repr__(self):
         return (
@@ -22,14 +49,20 @@ class Cell:
     def change_code(self, code, value):
         if code == "ordinal":
             self._ordinal = value
+            if self._seq is not None:
+                self._parent._cell_renumbered(self)
         elif code == "onset":
             self.onset = pv.to_millis(value)
         elif code == "offset":
             self.offset = pv.to_millis(value)
-        elif code in self.values.keys():
-            self.values[code] = value
         else:
-            raise Exception(f"Cell does not have code: {code}")
+            slot = self._slots().get(code)
+            if slot is None:
+                raise Exception(f"Cell does not have code: {code}")
+            old = self._values[slot]
+            self._values[slot] = value
+            if self._seq is not None:
+                self._parent._cell_changed(self, code, old)
 
     def get_code(self, code):
         if code == "ordinal":
@@ -38,10 +71,11 @@ class Cell:
             return self.onset
         elif code == "offset":
             return self.offset
-        elif code in self.values.keys():
-            return self.values[code]
         else:
-            raise Exception(f"Cell does not contain code: {code}")
+            slot = self._slots().get(code)
+            if slot is None:
+                raise Exception(f"Cell does not contain code: {code}")
+            return self._values[slot]
 
     def set_values(self, *values):
         for code, value in zip(self.parent.codelist, values):
@@ -83,7 +117,41 @@ class Cell:
 
     def isempty(self):
         """ Return true if all code values are "" or null"""
-        return all(v == "" or v is None for v in self.values.values())
+        return all(v == "" or v is None for v in self.get_values())
+
+    @property
+    def values(self):
+        return CellValues(self)
+
+    @values.setter
+    def values(self, values):
+        for code in values:
+            if code not in self._slots():
+                raise Exception(f"Cell does not have code: {code}")
+        for code in self._slots():
+            self.change_code(code, values.get(code, ""))
+
+    @property
+    def onset(self):
+        return self._onset
+
+    @onset.setter
+    def onset(self, value):
+        old = getattr(self, "_onset", value)
+        self._onset = value
+        if self._seq is not None and self._parent is not None:
+            self._parent._cell_moved(self, old, self._offset)
+
+    @property
+    def offset(self):
+        return self._offset
+
+    @offset.setter
+    def offset(self, value):
+        old = getattr(self, "_offset", value)
+        self._offset = value
+        if self._seq is not None and self._parent is not None:
+            self._parent._cell_moved(self, self._onset, old)
 
     @property
     def parent(self):
@@ -93,24 +161,67 @@ class Cell:
     def ordinal(self):
         return self._ordinal
 
-    def _to_opfdb(self):
+    def _to_opfdb(self, onset=None, offset=None):
+        """onset and offset may be passed in already formatted as timestamps."""
+
+        onset = onset or pv.to_timestamp(self.onset)
+        offset = offset or pv.to_timestamp(self.offset)
         return (
-                f"{pv.to_timestamp(self.onset)},{pv.to_timestamp(self.offset)},"
+                f"{onset},{offset},"
                 + "("
-                + ",".join([v for v in self.get_values()])
+                + ",".join([pv._escape_value(v) for v in self.get_values()])
                 + ")"
         )
 
-    def _to_json(self):
+    def _to_json(self, onset=None, offset=None):
         return {
             "id": self.ordinal,
-            "onset": pv.to_timestamp(self.onset),
-            "offset": pv.to_timestamp(self.offset),
+            "onset": onset or pv.to_timestamp(self.onset),
+            "offset": offset or pv.to_timestamp(self.offset),
             "values": [v for v in self.get_values()],
         }
 
     def __eq__(self, other):
         if isinstance(self, other.__class__):
-            return self.onset == other.onset and self.offset == other.offset and self.values == other.values
+            if self.onset != other.onset or self.offset != other.offset:
+                return False
+            if self._slots() == other._slots():
+                return self._values == other._values
+            return self.values == other.values
 
         return False
+
+
+class CellValues(MutableMapping):
+    """Code values of a cell as a dict-like view; writes go through change_code."""
+
+    __slots__ = ("_cell",)
+
+    def __init__(self, cell):
+        self._cell = cell
+
+    def __getitem__(self, code):
+        slot = self._cell._slots().get(code)
+        if slot is None:
+            raise KeyError(code)
+        return self._cell._values[slot]
+
+    def __setitem__(self, code, value):
+        if code not in self._cell._slots():
+            raise KeyError(code)
+        self._cell.change_code(code, value)
+
+    def __delitem__(self, code):
+        raise TypeError("Cell codes are set by the column and can't be removed")
+
+    def __iter__(self):
+        return iter(self._cell._slots())
+
+    def __len__(self):
+        return len(self._cell._slots())
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+_NO_CODES = {}
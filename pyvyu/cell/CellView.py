@@ -0,0 +1,65 @@
+from .. import pyvyu as pv
+from .Cell import Cell
+
+
+class CellView(Cell):
+    """
+    Cell backed by a row of an ArrayColumn.
+
+    Views hold no data of their own: reads and writes go straight to the
+    parent column's arrays.
+    """
+
+    __slots__ = ("_row",)
+
+    def __init__(self, parent, row):
+        self._parent = parent
+        self._row = row
+
+    def change_code(self, code, value):
+        if code == "ordinal":
+            self._parent._set(self._row, "ordinal", value)
+        elif code == "onset":
+            self.onset = pv.to_millis(value)
+        elif code == "offset":
+            self.offset = pv.to_millis(value)
+        elif code in self._parent.codelist:
+            self._parent._set(self._row, code, value)
+        else:
+            raise Exception(f"Cell does not have code: {code}")
+
+    def get_code(self, code):
+        if code in ("ordinal", "onset", "offset") or code in self._parent.codelist:
+            return self._parent._get(self._row, code)
+        else:
+            raise Exception(f"Cell does not contain code: {code}")
+
+    @property
+    def values(self):
+        return {code: self._parent._get(self._row, code) for code in self._parent.codelist}
+
+    @property
+    def onset(self):
+        return self._parent._get(self._row, "onset")
+
+    @onset.setter
+    def onset(self, value):
+        self._parent._set(self._row, "onset", value)
+
+    @property
+    def offset(self):
+        return self._parent._get(self._row, "offset")
+
+    @offset.setter
+    def offset(self, value):
+        self._parent._set(self._row, "offset", value)
+
+    @property
+    def ordinal(self):
+        return self._parent._get(self._row, "ordinal")
+
+    def __eq__(self, other):
+        if isinstance(other, Cell):
+            return self.onset == other.onset and self.offset == other.offset and self.values == other.values
+
+        return False
@@ -0,0 +1,416 @@
+import numpy as np
+import pandas as pd
+from .. import pyvyu as pv
+from ..cell.CellView import CellView
+from ..profiling.Stats import timed, count
+from .Column import Column, _versions
+from .ContentHash import cell_hash, cell_hashes, combine, update, digest
+from .IntervalIndex import range_positions, sweep_positions
+
+
+class ArrayColumn(Column):
+    """
+    Datavyu coding pass stored column-wise.
+
+    Ordinals, onsets and offsets live in int64 arrays and every code in its
+    own array of dictionary codes, so repeated NOMINAL values are stored
+    once. Cells are CellView objects created on demand. Removed or trimmed
+    away cells are only marked dead, which keeps existing views valid.
+    """
+
+    _intrinsics = ("ordinal", "onset", "offset")
+
+    def __init__(self, name="", *codes):
+        self.name = name
+        self.codelist = list(codes)
+        self._size = 0
+        self._alive = np.zeros(0, dtype=bool)
+        self._data = {k: np.zeros(0, dtype=np.int64) for k in self._intrinsics}
+        self._codes = {code: np.zeros(0, dtype=np.int32) for code in codes}
+        self._vocab = {code: [""] for code in codes}
+        self._lookup = {code: {"": 0} for code in codes}
+        self._index = None
+        self._fingerprint = (0, 0)
+        self._version = next(_versions)
+        self._saved = None
+        self._serialized = None
+
+    def new_cell(self, *values, **kwargs):
+        """New cell with values in order of codelist, or defined as keyword args."""
+
+        row = self._append()
+        view = CellView(self, row)
+        view.set_values(*values)
+        for code, value in kwargs.items():
+            view.change_code(code, value)
+        return view
+
+    @timed("cells")
+    def _fill(self, ordinals, onsets, offsets, rows):
+        """Append parsed cells in bulk; rows hold values in codelist order."""
+
+        start = self._size
+        self._reserve(start + len(ordinals))
+        stop = start + len(ordinals)
+        self._size = stop
+        self._touch()
+        self._alive[start:stop] = True
+        self._data["ordinal"][start:stop] = ordinals
+        self._data["onset"][start:stop] = onsets
+        self._data["offset"][start:stop] = offsets
+
+        for i, code in enumerate(self.codelist):
+            lookup = self._lookup[code]
+            vocab = self._vocab[code]
+            keys = []
+            for values in rows:
+                value = values[i] if i < len(values) else ""
+                key = lookup.get(value)
+                if key is None:
+                    key = lookup[value] = len(vocab)
+                    vocab.append(value)
+                keys.append(key)
+            self._codes[code][start:stop] = keys
+        self._index = None
+        if self._fingerprint is not None:
+            hashes = cell_hashes(
+                self._data["onset"][start:stop],
+                self._data["offset"][start:stop],
+                {c: (self._codes[c][start:stop], self._vocab[c]) for c in self.codelist},
+            )
+            self._fingerprint = update(self._fingerprint, added=combine(hashes))
+        count("cells", stop - start)
+
+    def _columnar(self):
+        rows = self._rows()
+        codes = {
+            code: (self._codes[code][rows], list(self._vocab[code])) for code in self.codelist
+        }
+        return (
+            self._data["ordinal"][rows],
+            self._data["onset"][rows],
+            self._data["offset"][rows],
+            codes,
+        )
+
+    def _adopt(self, ordinals, onsets, offsets, codes):
+        # Arrays are used as given, so memory-mapped data stays mapped
+        self._size = len(ordinals)
+        self._touch()
+        self._alive = np.ones(self._size, dtype=bool)
+        self._data = {"ordinal": ordinals, "onset": onsets, "offset": offsets}
+        self._codes = {code: codes[code][0] for code in self.codelist}
+        self._vocab = {code: list(codes[code][1]) for code in self.codelist}
+        self._lookup = {
+            code: {v: k for k, v in enumerate(vocab)} for code, vocab in self._vocab.items()
+        }
+        self._index = None
+        self._fingerprint = None
+
+    def remove_cell(self, cell):
+        """Remove a cell from this column."""
+
+        if self._alive[cell._row] and self._fingerprint is not None:
+            self._fingerprint = update(self._fingerprint, removed=self._hash_row(cell._row))
+        self._alive[cell._row] = False
+        self._index = None
+        self._touch()
+
+    @property
+    def cells(self):
+        return [CellView(self, row) for row in self._rows()]
+
+    @cells.setter
+    def cells(self, cells):
+        cells = list(cells)
+        ordinals = [c.ordinal for c in cells]
+        onsets = [c.onset for c in cells]
+        offsets = [c.offset for c in cells]
+        rows = [c.get_values() for c in cells]
+
+        # The old rows are only marked dead, as in remove_cell, so views of
+        # them keep reading their own data; the new cells are appended
+        self._alive[: self._size] = False
+        self._index = None
+        self._fingerprint = (0, 0)
+        self._fill(ordinals, onsets, offsets, rows)
+
+    def sorted_cells(self):
+        rows = self._rows()
+        order = np.argsort(self._data["ordinal"][rows], kind="stable")
+        return [CellView(self, row) for row in rows[order]]
+
+    def trim(self, onset, offset, shift=True):
+        rows = self._rows()
+        onsets = self._data["onset"][rows]
+        offsets = self._data["offset"][rows]
+
+        keep = (onsets <= offset) & (offsets >= onset)
+        self._alive[rows[~keep]] = False
+
+        rows = rows[keep]
+        onsets = np.maximum(onsets[keep], onset)
+        offsets = np.minimum(offsets[keep], offset)
+        if shift:
+            onsets = np.maximum(onsets - onset, 0)
+            offsets = np.maximum(offsets - onset, 0)
+        self._data["onset"][rows] = onsets
+        self._data["offset"][rows] = offsets
+        self._index = None
+        self._fingerprint = None
+        self._touch()
+
+        return self
+
+    @property
+    def index(self):
+        """Interval index over this column's cells."""
+
+        if self._index is None:
+            self._index = ArrayIndex(self)
+        return self._index
+
+    def _index_values(self, positions=None):
+        rows = self.index.rows if positions is None else self.index.rows[positions]
+        values = [self._data["ordinal"][rows]]
+        for code in self.codelist:
+            categories = pd.Index(self._vocab[code], dtype=object)
+            values.append(
+                pd.Categorical.from_codes(self._codes[code][rows], categories=categories)
+            )
+        return values
+
+    def _rows(self):
+        return np.flatnonzero(self._alive[: self._size])
+
+    def _reserve(self, size):
+        if size <= len(self._alive):
+            return
+
+        capacity = max(16, 2 * len(self._alive), size)
+        self._alive = self._grow(self._alive, capacity)
+        for arrays in (self._data, self._codes):
+            for key, arr in arrays.items():
+                arrays[key] = self._grow(arr, capacity)
+
+    def _grow(self, arr, capacity):
+        grown = np.zeros(capacity, dtype=arr.dtype)
+        grown[: self._size] = arr[: self._size]
+        return grown
+
+    def _append(self):
+        self._reserve(self._size + 1)
+
+        row = self._size
+        self._size += 1
+        self._touch()
+        self._alive[row] = True
+        for arr in self._data.values():
+            arr[row] = 0
+        for arr in self._codes.values():
+            arr[row] = 0
+        self._index = None
+        if self._fingerprint is not None:
+            self._fingerprint = update(self._fingerprint, added=self._hash_row(row))
+        return row
+
+    def _get(self, row, code):
+        if code in self._data:
+            return int(self._data[code][row])
+        return self._vocab[code][self._codes[code][row]]
+
+    def content_hash(self):
+        if self._fingerprint is None:
+            _, onsets, offsets, codes = self._columnar()
+            self._fingerprint = combine(cell_hashes(onsets, offsets, codes))
+        return digest(self._fingerprint)
+
+    def _hash_row(self, row):
+        return cell_hash(
+            int(self._data["onset"][row]),
+            int(self._data["offset"][row]),
+            [(code, self._get(row, code)) for code in self.codelist],
+        )
+
+    def _set(self, row, code, value):
+        self._touch()
+        if code != "ordinal" and self._fingerprint is not None and self._alive[row]:
+            old = self._hash_row(row)
+            self._set_value(row, code, value)
+            self._fingerprint = update(self._fingerprint, old, self._hash_row(row))
+        else:
+            self._set_value(row, code, value)
+
+    def _set_value(self, row, code, value):
+        if code in self._data:
+            self._data[code][row] = value
+            if code != "ordinal":
+                self._index = None
+            return
+
+        lookup = self._lookup[code]
+        key = lookup.get(value)
+        if key is None:
+            key = len(self._vocab[code])
+            self._vocab[code].append(value)
+            lookup[value] = key
+        self._codes[code][row] = key
+        if self._index is not None:
+            self._index.invalidate(code)
+
+    def _iter_opfdb(self):
+        yield self._opfdb_header()
+        escaped = {c: [pv._escape_value(v) for v in self._vocab[c]] for c in self.codelist}
+        for rows, onsets, offsets in self._timestamp_chunks():
+            keys = [self._codes[c][rows].tolist() for c in self.codelist]
+            vocabs = [escaped[c] for c in self.codelist]
+            for i, (onset, offset) in enumerate(zip(onsets, offsets)):
+                values = ",".join([vocab[k[i]] for vocab, k in zip(vocabs, keys)])
+                yield f"{onset},{offset},({values})"
+
+    def _opfdb_size(self):
+        rows = self._rows()
+        size = len(self._opfdb_header()) + len(rows) * (2 * 12 + len(self.codelist) + 4)
+        for code in self.codelist:
+            counts = np.bincount(self._codes[code][rows], minlength=len(self._vocab[code]))
+            lengths = np.array([len(v) for v in self._vocab[code]], dtype=np.int64)
+            size += 2 * int(counts @ lengths)
+        return size
+
+    def _records(self, millis=False, size=1 << 12):
+        live = self._rows()
+        vocabs = [self._vocab[c] for c in self.codelist]
+        for start in range(0, len(live), size):
+            rows = live[start : start + size]
+            onsets = self._data["onset"][rows]
+            offsets = self._data["offset"][rows]
+            if not millis:
+                onsets = pv.to_timestamp(onsets)
+                offsets = pv.to_timestamp(offsets)
+            decoded = [[vocab[k] for k in self._codes[c][rows].tolist()] for vocab, c in zip(vocabs, self.codelist)]
+            values = [list(row) for row in zip(*decoded)] if decoded else [[] for _ in range(len(rows))]
+            yield self._data["ordinal"][rows].tolist(), onsets.tolist(), offsets.tolist(), values
+
+    def _timestamp_chunks(self, size=1 << 12):
+        """Yield (rows, onset timestamps, offset timestamps) in bounded chunks."""
+
+        live = self._rows()
+        for start in range(0, len(live), size):
+            rows = live[start : start + size]
+            yield (
+                rows,
+                pv.to_timestamp(self._data["onset"][rows]).tolist(),
+                pv.to_timestamp(self._data["offset"][rows]).tolist(),
+            )
+
+
+class ArrayIndex:
+    """
+    Interval index over the live rows of an ArrayColumn.
+
+    Same queries as IntervalIndex, answered with searchsorted over onset-sorted
+    arrays. It is rebuilt in one vectorized pass after the column changes.
+    """
+
+    def __init__(self, column):
+        self._column = column
+        rows = column._rows()
+        onsets = column._data["onset"][rows]
+        order = np.argsort(onsets, kind="stable")  # ties keep insertion order
+        self.rows = rows[order]
+        self._onsets = onsets[order]
+        self._offsets = column._data["offset"][self.rows]
+        self._maxoff = np.maximum.accumulate(self._offsets) if len(rows) else self._offsets
+        self._by_value = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.cells)
+
+    @property
+    def cells(self):
+        return [self.cell(p) for p in range(len(self.rows))]
+
+    def arrays(self):
+        return self._onsets, self._offsets
+
+    def overlapping(self):
+        return bool(np.any(self._onsets[1:] <= self._maxoff[:-1]))
+
+    def value_positions(self, code):
+        groups = self._by_value.get(code)
+        if groups is None:
+            groups = self._by_value[code] = self._group(code)
+        return groups
+
+    def invalidate(self, code):
+        self._by_value.pop(code, None)
+
+    def _group(self, code):
+        # Group positions by dictionary key with one stable sort
+        keys = self._column._codes[code][self.rows]
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else []
+        vocab = self._column._vocab[code]
+        return {
+            vocab[keys[start]]: order[start:stop]
+            for start, stop in zip(starts, list(starts[1:]) + [len(keys)])
+        }
+
+    def positions_at(self, times):
+        times = np.asarray(times, dtype=np.int64)
+        if len(self.rows) == 0:
+            return np.full(len(times), -1, dtype=np.int64)
+
+        if self.overlapping():
+            return np.array(
+                sweep_positions(self._onsets, self._offsets, self.rows, times),
+                dtype=np.int64,
+            )
+        pos = np.searchsorted(self._onsets, times, side="right") - 1
+        spans = (pos >= 0) & (self._offsets[np.maximum(pos, 0)] >= times)
+        pos[~spans] = -1
+        return pos
+
+    def positions_in_range(self, onset, offset):
+        # Cells before lo end before onset; cells from hi start after offset.
+        lo = np.searchsorted(self._maxoff, onset, side="left")
+        hi = np.searchsorted(self._onsets, offset, side="right")
+        return lo + np.flatnonzero(self._offsets[lo:hi] >= onset)
+
+    def positions_in_ranges(self, onsets, offsets):
+        return range_positions(self._onsets, self._offsets, onsets, offsets)
+
+    def seqs(self, positions):
+        return self.rows[positions]
+
+    def cell(self, pos):
+        return CellView(self._column, self.rows[pos])
+
+    def at(self, time):
+        return self.in_range(time, time)
+
+    def in_range(self, onset, offset):
+        pos = self.positions_in_range(onset, offset)
+        if len(pos) == 0:
+            return None
+        return self.cell(pos[np.argmin(self.rows[pos])])
+
+    def all_at(self, time):
+        return self.all_in_range(time, time)
+
+    def all_in_range(self, onset, offset):
+        return [self.cell(p) for p in self.positions_in_range(onset, offset)]
+
+    def at_many(self, times):
+        times = np.asarray(times, dtype=np.int64)
+        order = np.argsort(times, kind="stable")
+        pos = np.empty(len(times), dtype=np.int64)
+        pos[order] = self.positions_at(times[order])
+        return [self.cell(p) if p >= 0 else None for p in pos]
+
+    def at_sorted(self, times):
+        return [self.cell(p) if p >= 0 else None for p in self.positions_at(times)]
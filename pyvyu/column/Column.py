@@ -1,4 +1,13 @@
+import itertools
+import json
+from json.encoder import encode_basestring_ascii
+import numpy as np
+import pandas as pd
+from .. import pyvyu as pv
 from ..cell.Cell import Cell
+from ..profiling.Stats import timed, count
+from .IntervalIndex import IntervalIndex
+from .ContentHash import cell_hash, cell_hashes, combine, update, digest
 
 class Column:
     """Representation of a Datavyu coding pass."""
@@ -6,7 +15,13 @@ class Column:
     def __init__(self, name="", *codes):
         self.name = name
         self.codelist = list(codes)
-        self.cells = []
+        self._slots = {code: slot for slot, code in enumerate(self.codelist)}
+        self._cells = CellList(self)
+        self._index = IntervalIndex()
+        self._fingerprint = (0, 0)  # content hash lanes, None until computed
+        self._version = next(_versions)  # renewed on every modification
+        self._saved = None  # version last loaded or saved
+        self._serialized = None  # (cache key, text) kept from the last save
 
     def new_cell(self, *values, **kwargs):
         """New cell with values in order of codelist, or defined as keyword args."""
@@ -18,36 +33,436 @@ class Column:
         for code, value in kwargs.items():
             c.change_code(code, value)
 
-        # Insert '' for undefined codes
-        for code in self.codelist - c.values.keys():
-            c.change_code(code, "")
-
-        self.cells.append(c)
+        index = self.index
+        list.append(self._cells, c)  # kept indexed here, not dropped by CellList
+        index.add(c)
+        self._touch()
+        if self._fingerprint is not None:
+            self._fingerprint = update(self._fingerprint, added=self._hash_cell(c))
         return c
 
+    def extend(self, onsets, offsets, values=None, ordinals=None):
+        """
+        Append many cells at once.
+
+        onsets and offsets are sequences of milliseconds or timestamps.
+        values is either a dict mapping codes to sequences or a sequence of
+        rows in codelist order; codes left out are set to "". Values are
+        stored as strings, with None and NaN read as "". ordinals
+        default to numbering on from the cells already in the column. The
+        whole batch is checked before any cell is added.
+        """
+
+        onsets = np.asarray(pv.to_millis(list(onsets)), dtype=np.int64)
+        offsets = np.asarray(pv.to_millis(list(offsets)), dtype=np.int64)
+        count = len(onsets)
+        if ordinals is None:
+            ordinals = range(len(self.index) + 1, len(self.index) + count + 1)
+        ordinals = list(ordinals)
+
+        if values is None:
+            values = {}
+        if isinstance(values, dict):
+            for code in values:
+                if code not in self.codelist:
+                    raise Exception(f"Column does not contain code: {code}")
+            columns = [_nominal(values.get(code, [""] * count)) for code in self.codelist]
+            lengths = [len(column) for column in columns]
+            rows = [list(row) for row in zip(*columns)] if columns else [[] for _ in onsets]
+        else:
+            rows = [_nominal(row) for row in values]
+            if any(len(row) > len(self.codelist) for row in rows):
+                raise AttributeError(f"More values than codes in column {self.name}")
+            lengths = [len(rows)]
+
+        if any(n != count for n in [len(offsets), len(ordinals)] + lengths):
+            raise AttributeError("onsets, offsets, values and ordinals differ in length")
+
+        self._fill(ordinals, onsets.tolist(), offsets.tolist(), rows)
+        return self
+
+    @classmethod
+    def from_dataframe(cls, df, name=""):
+        """
+        Build a column from a DataFrame of cells: onset and offset columns
+        (milliseconds or timestamps), an optional ordinal column or index,
+        and one column per code, its values read as strings and missing
+        ones as "".
+        """
+
+        if "ordinal" in df.columns:
+            ordinals = df["ordinal"].tolist()
+        elif df.index.name == "ordinal":
+            ordinals = df.index.tolist()
+        else:
+            ordinals = None
+
+        codes = [var for var in df.columns if var not in ("ordinal", "onset", "offset")]
+        values = {
+            code: df[code].astype(object).where(df[code].notna(), "").tolist() for code in codes
+        }
+        return cls(name, *codes).extend(df["onset"], df["offset"], values, ordinals)
+
+    @timed("cells")
+    def _fill(self, ordinals, onsets, offsets, rows):
+        """Append parsed cells in bulk; rows hold values in codelist order."""
+
+        size = len(self.codelist)
+        blank = [""] * size
+        new = [
+            Cell._from_parsed(
+                self,
+                ordinal,
+                onset,
+                offset,
+                # Sliced copies are allocated to size, unlike str.split output
+                (values if len(values) >= size else [*values, *blank])[:size],
+            )
+            for ordinal, onset, offset, values in zip(ordinals, onsets, offsets, rows)
+        ]
+
+        count("cells", len(new))
+        self._touch()
+        if self.cells:
+            # Take the index first, it would rebuild itself over the extended list
+            index = self.index
+            list.extend(self._cells, new)
+            for c in new:
+                index.add(c)
+            if self._fingerprint is not None:
+                for c in new:
+                    self._fingerprint = update(self._fingerprint, added=self._hash_cell(c))
+        else:
+            # Index and hash lazily on first use; the provisional insertion
+            # order lets cells report edits before that
+            for seq, c in enumerate(new):
+                c._seq = seq
+            self.cells = new
+            self._index = None
+            self._fingerprint = None
+
+    def _columnar(self):
+        """
+        Ordinals, onsets and offsets of the cells, in cell order, as int64
+        arrays, plus each code dictionary-encoded as (int32 keys, vocabulary).
+        """
+
+        cells = self.cells
+        ordinals = np.array([c.ordinal for c in cells], dtype=np.int64)
+        onsets = np.array([c.onset for c in cells], dtype=np.int64)
+        offsets = np.array([c.offset for c in cells], dtype=np.int64)
+
+        codes = {}
+        values = [c._values for c in cells]
+        for slot, code in enumerate(self.codelist):
+            lookup = {"": 0}
+            add = lookup.setdefault
+            keys = [add(v[slot], len(lookup)) for v in values]
+            codes[code] = (np.array(keys, dtype=np.int32), list(lookup))
+        return ordinals, onsets, offsets, codes
+
+    def _adopt(self, ordinals, onsets, offsets, codes):
+        """Replace the cells with the output of _columnar."""
+
+        decoded = [
+            [vocab[k] for k in keys.tolist()]
+            for keys, vocab in (codes[code] for code in self.codelist)
+        ]
+        self.cells = []
+        self._fill(
+            ordinals.tolist(),
+            onsets.tolist(),
+            offsets.tolist(),
+            [list(values) for values in zip(*decoded)] or [[] for _ in ordinals],
+        )
+
+    def remove_cell(self, cell):
+        """Remove a cell from this column."""
+
+        index = self.index
+        list.remove(self._cells, cell)
+        self._touch()
+        if index.remove(cell) and self._fingerprint is not None:
+            self._fingerprint = update(self._fingerprint, removed=self._hash_cell(cell))
+
     def sorted_cells(self):
         return sorted(self.cells, key=lambda x: x.ordinal)
 
     def cell_at(self, time):
         """Return a cell spanning a time point in this column, if any."""
 
-        cell = next((cell for cell in self.cells if cell.spans(time)), None)
-        return cell
+        return self.index.at(time)
+
+    def cells_at(self, times):
+        """Return the cell spanning each of the given time points (None if none)."""
+
+        return self.index.at_many(times)
 
     def cell_in_range(self, onset, offset):
-        cell = next((cell for cell in self.cells if cell.in_range(onset, offset)), None)
-        return cell
+        """Return a cell overlapping the interval [onset, offset], if any."""
+
+        return self.index.in_range(onset, offset)
+
+    def cells_in_range(self, onset, offset):
+        """Return all cells overlapping the interval [onset, offset], ordered by onset."""
+
+        return self.index.all_in_range(onset, offset)
+
+    def query(self, where=None, during=None):
+        """
+        Cells whose codes match where, ordered by onset.
+
+        where maps codes to a value, or to a predicate called once per
+        distinct value of the code; during=(onset, offset) keeps only cells
+        overlapping that interval. Codes are looked up in inverted value
+        indexes built on first use and dropped when the column or the code
+        changes.
+        """
+
+        index = self.index
+        matches = None
+        if during is not None:
+            matches = index.positions_in_range(*during)
+
+        for code, condition in (where or {}).items():
+            if code not in self.codelist:
+                raise Exception(f"Column does not contain code: {code}")
+
+            groups = index.value_positions(code)
+            if callable(condition):
+                found = [pos for value, pos in groups.items() if condition(value)]
+                found = np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+            else:
+                found = groups.get(condition, np.zeros(0, dtype=np.int64))
+            matches = found if matches is None else np.intersect1d(matches, found, assume_unique=True)
+
+        if matches is None:
+            return list(index.cells)
+        return [index.cell(p) for p in np.sort(matches)]
+
+    def to_timeseries(self, bin_ms, start=0, stop=None, occupancy=False, rle=False):
+        """
+        Rasterize this column into bins of bin_ms milliseconds from start up
+        to stop (default: just past the last cell's offset). Bin i holds the
+        value at time start + i * bin_ms, as cell_at would find it; bin_ms
+        may be fractional, e.g. 1000 / 29.97 for video frames.
+
+        Returns a dict mapping each code to (keys, categories): int32 keys
+        into the categories list per bin, -1 where no cell spans the bin.
+        With occupancy=True, returns a boolean array instead, True where a
+        cell spans the bin. With rle=True every array is replaced by its
+        runs as (first bins, run lengths, run values) arrays, found from the
+        cell boundaries without building the dense series.
+        """
+
+        onsets, offsets = self.index.arrays()
+        if stop is None:
+            stop = int(offsets.max()) + 1 if len(offsets) else start
+        count = max(int(np.ceil((stop - start) / bin_ms)), 0)
+
+        if rle:
+            bins = _run_bins(np.concatenate((onsets, offsets + 1)), start, bin_ms, count)
+        else:
+            bins = np.arange(count, dtype=np.int64)
+        pos = self.index.positions_at(_bin_times(bins, start, bin_ms))
+
+        if occupancy:
+            series = pos >= 0
+            return _runs(bins, series, count) if rle else series
+
+        if len(pos) > len(onsets):
+            # Cheaper to encode every cell than to sort the bins
+            used, inverse = np.arange(-1, len(onsets)), pos + 1
+        else:
+            used, inverse = np.unique(pos, return_inverse=True)
+        found = used >= 0
+        result = {}
+        for code, values in zip(self.codelist, self._index_values(used[found])[1:]):
+            keys, categories = _encode(values)
+            lookup = np.full(len(used), -1, dtype=np.int32)
+            lookup[found] = keys
+            series = lookup[inverse.reshape(-1)]
+            result[code] = (_runs(bins, series, count) if rle else series, categories)
+        return result
 
     def trim(self, onset, offset, shift=True):
+        # Cells are edited in bulk, so re-index once afterwards.
+        self._index = None
+        self._fingerprint = None
+        self._touch()
         if shift:
             self.cells = [cell.trim(onset, offset).shift(onset) for cell in self.cells if
                              cell.in_range(onset, offset)]
         else:
             self.cells = [cell.trim(onset, offset) for cell in self.cells if
                              cell.in_range(onset, offset)]
+        self._index = IntervalIndex(self.cells)
 
         return self
 
+    @property
+    def cells(self):
+        """
+        This column's cells, in the order they were added. The list may be
+        edited directly; the index and content hash are then rebuilt on
+        next use.
+        """
+
+        return self._cells
+
+    @cells.setter
+    def cells(self, cells):
+        self._cells = CellList(self, cells)
+        self._cells_edited()
+
+    def _cells_edited(self):
+        self._index = None
+        self._fingerprint = None
+        self._touch()
+
+    @property
+    def index(self):
+        """Interval index over this column's cells."""
+
+        if self._index is None:
+            self._index = IntervalIndex(self._cells)
+            self._fingerprint = None
+        return self._index
+
+    @property
+    def modified(self):
+        """True if this column changed since it was loaded or last saved."""
+
+        return self._version != self._saved
+
+    def content_hash(self):
+        """
+        128-bit hash of the onsets, offsets and code values of this column's
+        cells, ignoring their order and ordinals. It is kept up to date as
+        cells are added, removed or edited, so comparing columns is O(1)
+        once it has been computed.
+        """
+
+        self.index  # index the cells so their edits reach the hash
+        if self._fingerprint is None:
+            _, onsets, offsets, codes = self._columnar()
+            self._fingerprint = combine(cell_hashes(onsets, offsets, codes))
+        return digest(self._fingerprint)
+
+    def _hash_cell(self, cell, onset=None, offset=None, values=None):
+        return cell_hash(
+            cell.onset if onset is None else onset,
+            cell.offset if offset is None else offset,
+            zip(self.codelist, cell._values if values is None else values),
+        )
+
+    def _index_values(self, positions=None):
+        """
+        Ordinals and code values of the indexed cells, or of those at the
+        given index positions, one sequence per variable.
+        """
+
+        index = self.index
+        cells = index.cells if positions is None else [index.cell(p) for p in positions]
+        values = [c._values for c in cells]
+        return [[c.ordinal for c in cells]] + [
+            [v[slot] for v in values] for slot in range(len(self.codelist))
+        ]
+
+    def __getstate__(self):
+        # The index is rebuilt on demand, no need to ship it between processes
+        state = self.__dict__.copy()
+        state["_index"] = None
+        state["_fingerprint"] = None
+        state["_serialized"] = None
+        # Versions only order modifications within one process; keep
+        # whether the column was modified and number it afresh on arrival
+        state["_saved"] = self.modified
+        del state["_version"]
+        return state
+
+    def __setstate__(self, state):
+        modified = state.pop("_saved")
+        self.__dict__.update(state)
+        if "_cells" in state:
+            self._cells = CellList(self, self._cells)
+        self._version = next(_versions)
+        self._saved = None if modified else self._version
+
+    def _touch(self):
+        self._version = next(_versions)
+
+    def _mark_saved(self):
+        self._saved = self._version
+
+    def _fragment(self, fmt, compact=False, millis=False):
+        """
+        Yield this column serialized as "opf" db lines or a "json" pass as
+        _iter_json renders it, a bounded chunk at a time. Text of up to
+        FRAGMENT_CACHE_SIZE chars is kept until the column is next modified
+        or saved in another format, so saves only re-render edited columns;
+        longer text is streamed and not kept.
+        """
+
+        key = self._fragment_key(fmt, compact, millis)
+        if self._serialized is not None and self._serialized[0] == key:
+            yield self._serialized[1]
+            return
+
+        self._serialized = None
+        if fmt == "opf":
+            chunks = _joined(self._iter_opfdb(), "\n")
+        else:
+            chunks = self._iter_json(compact, millis)
+        kept, size = [], 0
+        for text in chunks:
+            if kept is not None:
+                size += len(text)
+                if size <= FRAGMENT_CACHE_SIZE:
+                    kept.append(text)
+                else:
+                    kept = None
+            yield text
+        if kept is not None:
+            self._serialized = (key, "".join(kept))
+
+    def _fragment_key(self, fmt, compact=False, millis=False):
+        return (fmt, compact, millis, self._version, self.name, tuple(self.codelist))
+
+    def _opfdb_size(self):
+        """Upper bound of the length of this column's db lines."""
+
+        if self._serialized is not None and self._serialized[0] == self._fragment_key("opf"):
+            return len(self._serialized[1])
+        # Two 12-char timestamps, separators and values at most doubled by escaping
+        line = 2 * 12 + len(self.codelist) + 4
+        values = itertools.chain.from_iterable([c._values for c in self.cells])
+        return len(self._opfdb_header()) + line * len(self.cells) + 2 * sum(map(len, values))
+
+    def _cell_renumbered(self, cell):
+        self._touch()
+
+    def _cell_moved(self, cell, old_onset, old_offset):
+        self._touch()
+        if self._index is not None and self._index.move(cell, old_onset):
+            if self._fingerprint is not None:
+                self._fingerprint = update(
+                    self._fingerprint,
+                    self._hash_cell(cell, old_onset, old_offset),
+                    self._hash_cell(cell),
+                )
+
+    def _cell_changed(self, cell, code, old):
+        self._touch()
+        if self._index is not None:
+            self._index.invalidate(code)
+            if self._fingerprint is not None and self._index.contains(cell):
+                values = list(cell._values)
+                values[self._slots[code]] = old
+                self._fingerprint = update(
+                    self._fingerprint, self._hash_cell(cell, values=values), self._hash_cell(cell)
+                )
+
     def values_at(self, time, intrinsics=False):
         cell = self.cell_at(time)
         if cell is None:
@@ -56,7 +471,7 @@ class Column:
             if intrinsics is True:
                 return cell.get_values(True)
             else:
-                return cell.values()
+                return cell.get_values()
 
     def __repr__(self):
         return (
@@ -70,31 +485,255 @@ class Column:
     def _to_opfdb(self):
         """Converts to .opf compatible string."""
 
-        header = f"{self.name} (MATRIX,true,)-" + ",".join(
+        return "\n".join(self._iter_opfdb())
+
+    def _iter_opfdb(self):
+        """Yield the .opf db lines of this column: header, then one per cell."""
+
+        yield self._opfdb_header()
+        escape = pv._escape_value
+        for chunk, onsets, offsets in self._timestamp_chunks():
+            for c, onset, offset in zip(chunk, onsets, offsets):
+                # Cell._to_opfdb, reading the value slots directly
+                yield f"{onset},{offset},(" + ",".join([escape(v) for v in c._values]) + ")"
+
+    def _timestamp_chunks(self, size=1 << 12):
+        """Yield (cells, onset timestamps, offset timestamps) in bounded chunks."""
+
+        cells = self.cells
+        for start in range(0, len(cells), size):
+            chunk = cells[start : start + size]
+            onsets = pv.to_timestamp([c.onset for c in chunk]).tolist()
+            offsets = pv.to_timestamp([c.offset for c in chunk]).tolist()
+            yield chunk, onsets, offsets
+
+    def _opfdb_header(self):
+        return f"{self.name} (MATRIX,true,)-" + ",".join(
             [str(c) + "|NOMINAL" for c in self.codelist]
         )
-        lst = [c._to_opfdb() for c in self.cells]
-        lst.insert(0, header)
-        return "\n".join(lst)
 
-    def _to_json(self):
+    def _records(self, millis=False, size=1 << 12):
+        """
+        Yield (ordinals, onsets, offsets, values) lists of the cells in
+        bounded chunks, times as timestamps or, if millis, milliseconds.
+        """
+
+        cells = self.cells
+        for start in range(0, len(cells), size):
+            chunk = cells[start : start + size]
+            onsets = [c.onset for c in chunk]
+            offsets = [c.offset for c in chunk]
+            if not millis:
+                onsets = pv.to_timestamp(onsets).tolist()
+                offsets = pv.to_timestamp(offsets).tolist()
+            yield [c.ordinal for c in chunk], onsets, offsets, [c.get_values() for c in chunk]
+
+    def _to_json(self, millis=False):
         return {
             "name": self.name,
             "type": "MATRIX",
             "arguments": {c: "NOMINAL" for c in self.codelist},
-            "cells": [c._to_json() for c in self.cells],
+            "cells": [
+                {"id": ordinal, "onset": onset, "offset": offset, "values": values}
+                for chunk in self._records(millis)
+                for ordinal, onset, offset, values in zip(*chunk)
+            ],
+        }
+
+    def _iter_json(self, compact=False, millis=False):
+        """
+        Yield the text of this column as a pass of save_json, one chunk of
+        cells at a time: the same text as json.dumps(self._to_json(millis))
+        with no whitespace if compact, else with indent=4 and nested to
+        sit in the passes list.
+        """
+
+        head = {
+            "name": self.name,
+            "type": "MATRIX",
+            "arguments": {c: "NOMINAL" for c in self.codelist},
+            "cells": [],
         }
+        if compact:
+            head = json.dumps(head, separators=(",", ":"))
+            cell = '{{"id":{},"onset":{},"offset":{},"values":[{}]}}'
+            sep, pad, close = ",", "", "]}"
+        else:
+            # Ends in '"cells": []' and the closing brace
+            head = "        " + json.dumps(head, indent=4).replace("\n", "\n        ")
+            cell = (
+                "\n                {{"
+                '\n                    "id": {},'
+                '\n                    "onset": {},'
+                '\n                    "offset": {},'
+                '\n                    "values": [{}]'
+                "\n                }}"
+            )
+            sep, pad, close = ",\n                        ", "\n                        ", "\n            ]\n        }"
+
+        empty = True
+        for ordinals, onsets, offsets, values in self._records(millis):
+            pieces = []
+            for ordinal, onset, offset, row in zip(ordinals, onsets, offsets, values):
+                row = sep.join([_json_value(v) for v in row])
+                if row and pad:
+                    row = pad + row + "\n                    "
+                pieces.append(cell.format(_json_value(ordinal), _json_value(onset), _json_value(offset), row))
+            if empty:
+                yield head[: head.rindex("[")] + "["
+                empty = False
+            else:
+                yield ","
+            yield ",".join(pieces)
+        yield head if empty else close
 
     def __eq__(self, other):
         if isinstance(self, other.__class__):
-            if len(self.cells) != len(other.cells):
-                return False
-
-            for index, cell in enumerate(self.cells):
-                if cell != other.cells[index]:
-                    return False
-            return True
+            return self.content_hash() == other.content_hash()
 
         return False
 
 
+# Column versions are unique across columns and re-initialisations
+_versions = itertools.count()
+
+# Chars of serialized text a column keeps between saves
+FRAGMENT_CACHE_SIZE = 1 << 16
+
+
+class CellList(list):
+    """
+    Cell list of a Column. Editing it drops the column's index and content
+    hash, so direct edits like col.cells[i] = cell are never served stale.
+    Copies are plain lists.
+    """
+
+    __slots__ = ("_column",)
+
+    def __init__(self, column, cells=()):
+        super().__init__(cells)
+        self._column = column
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._column._cells_edited()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._column._cells_edited()
+
+    def __iadd__(self, cells):
+        super().__iadd__(cells)
+        self._column._cells_edited()
+        return self
+
+    def __imul__(self, n):
+        super().__imul__(n)
+        self._column._cells_edited()
+        return self
+
+    def append(self, cell):
+        super().append(cell)
+        self._column._cells_edited()
+
+    def extend(self, cells):
+        super().extend(cells)
+        self._column._cells_edited()
+
+    def insert(self, pos, cell):
+        super().insert(pos, cell)
+        self._column._cells_edited()
+
+    def remove(self, cell):
+        super().remove(cell)
+        self._column._cells_edited()
+
+    def pop(self, pos=-1):
+        cell = super().pop(pos)
+        self._column._cells_edited()
+        return cell
+
+    def clear(self):
+        super().clear()
+        self._column._cells_edited()
+
+    def sort(self, *, key=None, reverse=False):
+        super().sort(key=key, reverse=reverse)
+        self._column._cells_edited()
+
+    def reverse(self):
+        super().reverse()
+        self._column._cells_edited()
+
+
+def _encode(values):
+    """Dictionary-encode values into (codes, categories); missing values get -1."""
+
+    if not isinstance(values, pd.Categorical):
+        values = np.asarray(values, dtype=object)
+    codes, categories = pd.factorize(values)
+    return codes, list(categories)
+
+
+def _bin_times(bins, start, bin_ms):
+    """Start times of the given bins, in whole milliseconds."""
+
+    return np.floor(start + bins * bin_ms).astype(np.int64)
+
+
+def _run_bins(boundaries, start, bin_ms, count):
+    """
+    Bins where a series sampled at _bin_times can change value: the first
+    bin, and those around each time the set of spanning cells changes.
+    Neighbours are included so float rounding of fractional bins can't
+    skip a change.
+    """
+
+    if count == 0:
+        return np.zeros(0, dtype=np.int64)
+    bins = np.ceil((boundaries - start) / bin_ms).astype(np.int64)
+    bins = np.concatenate(([0], bins - 1, bins, bins + 1))
+    bins = np.sort(bins[(bins >= 0) & (bins < count)])
+    return bins[np.r_[True, bins[1:] != bins[:-1]]]
+
+
+def _runs(bins, values, count):
+    """Run-length encode values sampled at bins: (first bins, lengths, values)."""
+
+    keep = np.ones(len(values), dtype=bool)
+    keep[1:] = values[1:] != values[:-1]
+    firsts = bins[keep]
+    return firsts, np.diff(np.append(firsts, count)), values[keep]
+
+
+def _nominal(values):
+    """Values as the strings .opf NOMINAL codes hold; None and NaN become ""."""
+
+    return [
+        v if isinstance(v, str) else "" if v is None or v != v else str(v) for v in values
+    ]
+
+
+def _joined(lines, sep, size=1 << 10):
+    """The text of sep.join(lines), yielded size lines at a time."""
+
+    lines = iter(lines)
+    batch = list(itertools.islice(lines, size))
+    yield sep.join(batch)
+    while batch:
+        batch = list(itertools.islice(lines, size))
+        if batch:
+            yield sep + sep.join(batch)
+
+
+def _json_value(value):
+    """JSON text of one value, as json.dumps writes it."""
+
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    if type(value) is int:
+        return str(value)
+    return json.dumps(value)
@@ -0,0 +1,146 @@
+import numpy as np
+from ..cell.Cell import Cell
+from .ArrayColumn import ArrayIndex
+from .IntervalIndex import group_positions
+from .Column import Column, _versions
+
+
+class ColumnWindow(Column):
+    """
+    Read-only view of the cells of a column overlapping [onset, offset].
+
+    Nothing is copied up front: on first query the overlapping cells are
+    found by slicing the column's interval index and their ordinals and
+    values are copied, and cells are built from those, clipped to the
+    window (and shifted to start at 0 if shift is True), as they are read.
+    Cells handed out are detached copies, so editing them leaves the column
+    alone. The view reflects the column as it was when first queried; take
+    a new window after editing the column, or call materialize() to get an
+    independent column equal to trimming a copy of it.
+    """
+
+    def __init__(self, column, onset, offset, shift=True, positions=None):
+        """positions: index positions of the overlapping cells, if already known."""
+
+        if onset > offset:
+            raise AttributeError('the Onset cannot be greater than the Offset')
+
+        self.column = column
+        self.name = column.name
+        self.codelist = column.codelist
+        self._slots = {code: slot for slot, code in enumerate(self.codelist)}
+        self.onset = onset
+        self.offset = offset
+        self.shift = shift
+        self._positions = positions
+        self._index = None
+        self._fingerprint = None
+        self._version = next(_versions)
+        self._saved = None
+        self._serialized = None
+
+    @property
+    def cells(self):
+        """Clipped cells in the column's cell order."""
+
+        index = self.index
+        return [index.cell(p) for p in np.argsort(index.rows, kind="stable")]
+
+    @cells.setter
+    def cells(self, cells):
+        raise AttributeError("Column windows are read-only, materialize() them first")
+
+    @property
+    def index(self):
+        """Interval index over the clipped cells of this window."""
+
+        if self._index is None:
+            self._index = WindowIndex(self)
+        return self._index
+
+    def materialize(self):
+        """Copy the window into a new column of the underlying column's type."""
+
+        source = self.column
+        while isinstance(source, ColumnWindow):
+            source = source.column
+
+        cells = self.cells
+        ncol = type(source)(self.name, *self.codelist)
+        ncol._fill(
+            [c.ordinal for c in cells],
+            [c.onset for c in cells],
+            [c.offset for c in cells],
+            [c.get_values() for c in cells],
+        )
+        return ncol
+
+    def new_cell(self, *values, **kwargs):
+        raise AttributeError("Column windows are read-only, materialize() them first")
+
+    def remove_cell(self, cell):
+        raise AttributeError("Column windows are read-only, materialize() them first")
+
+    def trim(self, onset, offset, shift=True):
+        raise AttributeError("Column windows are read-only, use window() or materialize()")
+
+    def _fill(self, ordinals, onsets, offsets, rows):
+        raise AttributeError("Column windows are read-only, materialize() them first")
+
+    def _adopt(self, ordinals, onsets, offsets, codes):
+        raise AttributeError("Column windows are read-only, materialize() them first")
+
+
+class WindowIndex(ArrayIndex):
+    """
+    Interval index over a ColumnWindow: the run of the column's index
+    overlapping the window, with onsets and offsets clipped and shifted.
+
+    Cells are ordered by clipped onset then insertion order, as in the
+    index of a trimmed copy, so the ArrayIndex queries apply as is.
+    """
+
+    def __init__(self, window):
+        index = window.column.index
+        onset, offset = window.onset, window.offset
+
+        positions = window._positions
+        if positions is None:
+            positions = index.positions_in_range(onset, offset)
+        seqs = index.seqs(positions)
+        onsets, offsets = index.arrays()
+        onsets = np.maximum(onsets[positions], onset)
+        offsets = np.minimum(offsets[positions], offset)
+        if window.shift:
+            onsets = np.maximum(onsets - onset, 0)
+            offsets = np.maximum(offsets - onset, 0)
+
+        # Cells clipped to the window onset now tie; order those by insertion
+        order = np.lexsort((seqs, onsets))
+        # Copied now, as index positions shift when the column is edited
+        values = window.column._index_values(positions[order])
+        self._column = window
+        self._ordinals = [int(v) for v in values[0]]
+        self._values = [list(v) for v in values[1:]]
+        self.rows = seqs[order]
+        self._onsets = onsets[order]
+        self._offsets = offsets[order]
+        self._maxoff = np.maximum.accumulate(self._offsets) if len(order) else self._offsets
+        self._cells = [None] * len(order)
+        self._by_value = {}
+
+    def _group(self, code):
+        return group_positions(self._values[self._column.codelist.index(code)])
+
+    def cell(self, pos):
+        cell = self._cells[pos]
+        if cell is None:
+            cell = Cell._from_parsed(
+                self._column,
+                self._ordinals[pos],
+                int(self._onsets[pos]),
+                int(self._offsets[pos]),
+                [values[pos] for values in self._values],
+            )
+            self._cells[pos] = cell
+        return cell
@@ -0,0 +1,104 @@
+"""
+Order-independent content hashes of columns.
+
+Every cell hashes to two 64-bit lanes mixed from its onset, offset and the
+(code, value) pairs of its codes; a column's hash is the lane-wise sum of
+its cells' hashes modulo 2**64. Adding, removing or editing a cell thus
+updates the column hash in O(1), and equal columns hash equal whatever
+order their cells were added in. Hashes are stable across processes.
+"""
+
+import hashlib
+from functools import lru_cache
+import numpy as np
+
+MASK = (1 << 64) - 1
+_SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F)
+_M1, _M2 = 0xBF58476D1CE4E5B9, 0x94D049BB133111EB
+
+
+def cell_hash(onset, offset, items):
+    """Hash lanes of one cell given its (code, value) pairs, as a pair of ints."""
+
+    sums = [0, 0]
+    for code, value in items:
+        vh = value_hash(code, value)
+        sums[0] += vh[0]
+        sums[1] += vh[1]
+
+    lanes = []
+    for seed, total in zip(_SEEDS, sums):
+        t = _mix((_mix((onset ^ seed) & MASK) + offset) & MASK)
+        lanes.append(_mix(t ^ (total & MASK)))
+    return lanes[0], lanes[1]
+
+
+def cell_hashes(onsets, offsets, codes):
+    """
+    Hash lanes of many cells as an (n, 2) uint64 array, from int64 onsets
+    and offsets and codes as {code: (keys, vocabulary)} from _columnar().
+    """
+
+    onsets = np.asarray(onsets, dtype=np.int64).view(np.uint64)
+    offsets = np.asarray(offsets, dtype=np.int64).view(np.uint64)
+    sums = np.zeros((len(onsets), 2), dtype=np.uint64)
+    for code, (keys, vocab) in codes.items():
+        table = np.array([value_hash(code, v) for v in vocab], dtype=np.uint64).reshape(-1, 2)
+        sums += table[np.asarray(keys)]
+
+    hashes = np.empty((len(onsets), 2), dtype=np.uint64)
+    for lane, seed in enumerate(_SEEDS):
+        t = _mix_array(_mix_array(onsets ^ np.uint64(seed)) + offsets)
+        hashes[:, lane] = _mix_array(t ^ sums[:, lane])
+    return hashes
+
+
+def combine(hashes):
+    """Column hash lanes of an (n, 2) array of cell hashes."""
+
+    return tuple(int(total) for total in hashes.sum(axis=0, dtype=np.uint64)) if len(hashes) else (0, 0)
+
+
+def update(lanes, removed=(0, 0), added=(0, 0)):
+    """Column hash lanes after taking one cell hash out and putting another in."""
+
+    return tuple((lane - r + a) & MASK for lane, r, a in zip(lanes, removed, added))
+
+
+def digest(lanes):
+    """Single 128-bit integer of hash lanes."""
+
+    return (lanes[0] << 64) | lanes[1]
+
+
+def value_hash(code, value):
+    try:
+        return _cached_hash(code, value)
+    except TypeError:
+        # Unhashable values, e.g. lists set through change_code, can't be cached
+        return _value_hash(code, value)
+
+
+def _value_hash(code, value):
+    if isinstance(value, str):
+        data = b"s" + value.encode("utf8")
+    else:
+        data = b"r" + repr(value).encode("utf8")
+    h = hashlib.blake2b(code.encode("utf8") + b"\0" + data, digest_size=16).digest()
+    return int.from_bytes(h[:8], "little"), int.from_bytes(h[8:], "little")
+
+
+_cached_hash = lru_cache(maxsize=1 << 16)(_value_hash)
+
+
+def _mix(x):
+    x = ((x ^ (x >> 30)) * _M1) & MASK
+    x = ((x ^ (x >> 27)) * _M2) & MASK
+    return x ^ (x >> 31)
+
+
+def _mix_array(x):
+    with np.errstate(over="ignore"):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(_M1)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(_M2)
+    return x ^ (x >> np.uint64(31))
@@ -0,0 +1,322 @@
+from bisect import bisect_left, bisect_right
+from heapq import heappop, heappush
+import numpy as np
+
+
+class IntervalIndex:
+    """
+    Sorted interval index over the cells of a column.
+
+    Cells are kept ordered by (onset, insertion order) alongside a running
+    maximum of their offsets, so the cells that can span a time point form a
+    contiguous run found with two bisections. Ties between overlapping cells
+    resolve to the earliest inserted one, matching a linear scan of the
+    column's cell list.
+    """
+
+    def __init__(self, cells=()):
+        self._keys = []  # (onset, seq) sort keys
+        self._offsets = []
+        self._maxoff = []  # running max of offsets
+        self._cells = []
+        self._seq = 0
+        self._arrays = None
+        self._by_value = {}  # code -> inverted value index
+        self.rebuild(cells)
+
+    def __len__(self):
+        return len(self._cells)
+
+    def __iter__(self):
+        return iter(self._cells)
+
+    def rebuild(self, cells):
+        """Re-index cells, assigning insertion order from their list order."""
+
+        entries = []
+        for seq, cell in enumerate(cells):
+            cell._seq = seq
+            entries.append(((cell.onset, seq), cell))
+        entries.sort(key=lambda e: e[0])
+
+        self._keys = [k for k, _ in entries]
+        self._cells = [c for _, c in entries]
+        self._offsets = [c.offset for c in self._cells]
+        self._seq = len(self._cells)
+        self._arrays = None
+        self._by_value = {}
+        self._maxoff = []
+        running = float("-inf")
+        for off in self._offsets:
+            running = max(running, off)
+            self._maxoff.append(running)
+
+    def add(self, cell):
+        """Index a cell. Appending in onset order costs O(1)."""
+
+        if getattr(cell, "_seq", None) is None:
+            cell._seq = self._seq
+            self._seq += 1
+
+        key = (cell.onset, cell._seq)
+        pos = bisect_right(self._keys, key)
+        self._keys.insert(pos, key)
+        self._cells.insert(pos, cell)
+        self._offsets.insert(pos, cell.offset)
+        self._maxoff.insert(pos, 0)
+        self._update_maxoff(pos)
+        self._arrays = None
+        self._by_value = {}
+
+    def remove(self, cell, onset=None):
+        """Drop a cell from the index. Pass onset if it changed since indexing."""
+
+        pos = self._find(cell, cell.onset if onset is None else onset)
+        if pos is None:
+            return False
+
+        del self._keys[pos]
+        del self._cells[pos]
+        del self._offsets[pos]
+        del self._maxoff[pos]
+        self._update_maxoff(pos)
+        self._arrays = None
+        self._by_value = {}
+        return True
+
+    def move(self, cell, old_onset):
+        """Re-position a cell whose onset or offset has changed. False if not indexed."""
+
+        if self.remove(cell, old_onset):
+            self.add(cell)
+            return True
+        return False
+
+    def contains(self, cell):
+        """True if this exact cell object is indexed."""
+
+        return self._find(cell, cell.onset) is not None
+
+    @property
+    def cells(self):
+        """Indexed cells, ordered by onset then insertion."""
+
+        return self._cells
+
+    def arrays(self):
+        """Onsets and offsets of the indexed cells as int64 arrays, in index order."""
+
+        if self._arrays is None:
+            self._arrays = (
+                np.fromiter((k[0] for k in self._keys), np.int64, len(self._keys)),
+                np.array(self._offsets, dtype=np.int64),
+            )
+        return self._arrays
+
+    def value_positions(self, code):
+        """
+        Inverted index of a code: dict mapping each value to the sorted
+        positions of the cells holding it. Built on first use and kept until
+        the index or that code changes.
+        """
+
+        groups = self._by_value.get(code)
+        if groups is None:
+            groups = self._by_value[code] = group_positions(
+                [c.get_code(code) for c in self._cells]
+            )
+        return groups
+
+    def invalidate(self, code):
+        """Forget the inverted index of a code whose values were edited."""
+
+        self._by_value.pop(code, None)
+
+    def overlapping(self):
+        """True if any two cells share a time point."""
+
+        onsets, offsets = self.arrays()
+        return bool(np.any(onsets[1:] <= np.maximum.accumulate(offsets)[:-1]))
+
+    def positions_at(self, times):
+        """
+        Index positions of the cells spanning each of the given sorted times
+        (-1 where none), as an int64 array.
+        """
+
+        times = np.asarray(times, dtype=np.int64)
+        onsets, offsets = self.arrays()
+        if len(onsets) == 0:
+            return np.full(len(times), -1, dtype=np.int64)
+
+        if self.overlapping():
+            pos = np.array(self._positions_sorted(times), dtype=np.int64)
+        else:
+            # Only the last cell starting at or before a time can span it
+            pos = np.searchsorted(onsets, times, side="right") - 1
+            spans = (pos >= 0) & (offsets[np.maximum(pos, 0)] >= times)
+            pos[~spans] = -1
+        return pos
+
+    def positions_in_range(self, onset, offset):
+        """Index positions of every cell overlapping [onset, offset], as an int64 array."""
+
+        lo, hi = self._candidates(onset, offset)
+        return lo + np.flatnonzero(self.arrays()[1][lo:hi] >= onset)
+
+    def positions_in_ranges(self, onsets, offsets):
+        """
+        Positions of the cells overlapping each range [onsets[i], offsets[i]],
+        as (range numbers, index positions) int64 arrays grouped by range.
+        """
+
+        return range_positions(*self.arrays(), onsets, offsets)
+
+    def seqs(self, positions):
+        """Insertion order of the cells at the given index positions."""
+
+        return np.array([self._keys[p][1] for p in positions.tolist()], dtype=np.int64)
+
+    def cell(self, pos):
+        """Cell at an index position."""
+
+        return self._cells[pos]
+
+    def at(self, time):
+        """Return the earliest inserted cell spanning time, or None."""
+
+        return self._first(self._candidates(time, time), time, time)
+
+    def in_range(self, onset, offset):
+        """Return the earliest inserted cell overlapping [onset, offset], or None."""
+
+        return self._first(self._candidates(onset, offset), onset, offset)
+
+    def all_at(self, time):
+        """Return every cell spanning time, ordered by onset."""
+
+        return self.all_in_range(time, time)
+
+    def all_in_range(self, onset, offset):
+        """Return every cell overlapping [onset, offset], ordered by onset."""
+
+        lo, hi = self._candidates(onset, offset)
+        return [
+            self._cells[i] for i in range(lo, hi) if self._offsets[i] >= onset
+        ]
+
+    def at_many(self, times):
+        """Return the cell spanning each of the given times (None if none)."""
+
+        times = list(times)
+        order = sorted(range(len(times)), key=times.__getitem__)
+        found = self.at_sorted([times[i] for i in order])
+        result = [None] * len(times)
+        for i, cell in zip(order, found):
+            result[i] = cell
+        return result
+
+    def at_sorted(self, times):
+        """
+        Return the cell spanning each of the given non-decreasing times.
+
+        Sweeps the sorted onsets once while keeping the started cells in a
+        heap ordered by insertion, so N lookups cost O((N + n) log n).
+        """
+
+        return [
+            self._cells[pos] if pos >= 0 else None
+            for pos in self._positions_sorted(times)
+        ]
+
+    def _positions_sorted(self, times):
+        onsets = [k[0] for k in self._keys]
+        seqs = [k[1] for k in self._keys]
+        return sweep_positions(onsets, self._offsets, seqs, times)
+
+    def _candidates(self, onset, offset):
+        # Cells before lo end before onset; cells from hi start after offset.
+        lo = bisect_left(self._maxoff, onset)
+        hi = bisect_right(self._keys, (offset, float("inf")))
+        return lo, hi
+
+    def _first(self, bounds, onset, offset):
+        best = None
+        for i in range(*bounds):
+            if self._offsets[i] >= onset:
+                cell = self._cells[i]
+                if best is None or cell._seq < best._seq:
+                    best = cell
+        return best
+
+    def _find(self, cell, onset):
+        key = (onset, getattr(cell, "_seq", None))
+        if key[1] is None:
+            return None
+        pos = bisect_left(self._keys, key)
+        if pos < len(self._keys) and self._cells[pos] is cell:
+            return pos
+        return None
+
+    def _update_maxoff(self, start):
+        # Stop once the stored running max agrees again; the tail is unchanged.
+        running = self._maxoff[start - 1] if start > 0 else float("-inf")
+        for i in range(start, len(self._offsets)):
+            running = max(running, self._offsets[i])
+            if self._maxoff[i] == running and i > start:
+                break
+            self._maxoff[i] = running
+
+
+def sweep_positions(onsets, offsets, seqs, times):
+    """
+    Positions of the interval spanning each of the given non-decreasing
+    times (-1 where none), for intervals sorted by onset. Overlaps resolve
+    to the lowest seq.
+    """
+
+    result = []
+    active = []
+    pos = 0
+    for t in times:
+        while pos < len(onsets) and onsets[pos] <= t:
+            heappush(active, (seqs[pos], pos))
+            pos += 1
+        # Intervals that ended can never span a later time point either.
+        while active and offsets[active[0][1]] < t:
+            heappop(active)
+        result.append(active[0][1] if active else -1)
+    return result
+
+
+def range_positions(onsets, offsets, starts, stops):
+    """
+    Positions of the intervals, sorted by onset, overlapping each of the
+    ranges [starts[i], stops[i]]. All ranges are binary searched against the
+    running maximum of offsets and the onsets at once, so N ranges cost
+    O(N log n) plus the size of the result. Returns (range numbers,
+    positions) as int64 arrays grouped by range.
+    """
+
+    starts = np.asarray(starts, dtype=np.int64)
+    stops = np.asarray(stops, dtype=np.int64)
+    if len(onsets) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # Intervals before lo end before the start; those from hi begin after the stop
+    lo = np.searchsorted(np.maximum.accumulate(offsets), starts, side="left")
+    hi = np.maximum(np.searchsorted(onsets, stops, side="right"), lo)
+    counts = hi - lo
+    ranges = np.repeat(np.arange(len(starts), dtype=np.int64), counts)
+    pos = np.repeat(lo - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+    keep = offsets[pos] >= starts[ranges]
+    return ranges[keep], pos[keep]
+
+
+def group_positions(values):
+    """Dict mapping each distinct value to the positions holding it, as int64 arrays."""
+
+    groups = {}
+    for pos, value in enumerate(values):
+        groups.setdefault(value, []).append(pos)
+    return {value: np.array(pos, dtype=np.int64) for value, pos in groups.items()}
@@ -0,0 +1,298 @@
+import os
+import logging as log
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from urllib.parse import quote
+import numpy as np
+import pandas as pd
+from .. import pyvyu as pv
+from ..profiling.Stats import timed, count
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    _strings = pa.dictionary(pa.int32(), pa.string())
+except ImportError:
+    pa = pq = _strings = None
+
+# Rows per Parquet row group
+ROW_GROUP_SIZE = 1 << 16
+
+
+@timed("save")
+def write_cells(sheet, path, columns=None, file=None, row_group_size=ROW_GROUP_SIZE, column_field=True, codes=None):
+    """
+    Write the cells of columns (default: all) of sheet to the Parquet file
+    path as a long table: one row per cell with its column, ordinal, onset
+    and offset in milliseconds, and a dictionary-encoded string field per
+    code of any of the columns, null where a cell's column lacks the code.
+
+    A row group holds at most row_group_size cells of one column, so only
+    one column's arrays are converted at a time. file, if given, adds a
+    leading file field holding it; column_field=False leaves out the column
+    field, for files partitioned by column. codes, if given, lists the code
+    fields instead, e.g. the codes of every column of the sheet, so that
+    the files of its columns share one schema.
+    """
+
+    _require_pyarrow()
+    cols = sheet.map_columns(*(sheet.columns.values() if columns is None else columns))
+    if codes is None:
+        codes = _codes(cols)
+
+    fields = [("file", _strings)] if file is not None else []
+    fields += [("column", _strings)] if column_field else []
+    fields += [(name, pa.int64()) for name in ("ordinal", "onset", "offset")]
+    fields += [(code, _strings) for code in codes]
+    schema = pa.schema(fields)
+
+    def row_groups():
+        for col in cols:
+            ordinals, onsets, offsets, values = col._columnar()
+            for start in range(0, len(ordinals), row_group_size):
+                rows = slice(start, start + row_group_size)
+                n = len(ordinals[rows])
+                arrays = [_constant(file, n)] if file is not None else []
+                arrays += [_constant(col.name, n)] if column_field else []
+                arrays += [pa.array(a[rows], type=pa.int64()) for a in (ordinals, onsets, offsets)]
+                for code in codes:
+                    if code in values:
+                        keys, vocab = values[code]
+                        arrays.append(_dictionary(keys[rows], vocab))
+                    else:
+                        arrays.append(_dictionary(np.full(n, -1, dtype=np.int32), []))
+                yield arrays
+
+    _write(path, schema, row_groups())
+
+
+@timed("save")
+def write_merged(sheet, path, columns=None, file=None, row_group_size=ROW_GROUP_SIZE, prune=True):
+    """
+    Write the merge_columns table of columns (default: all) of sheet to the
+    Parquet file path, with the fields of to_df: ordinal, onset, offset,
+    and per column its ordinal (null where no cell of it spans the
+    interval) and dictionary-encoded codes. file adds a leading file field.
+    """
+
+    _require_pyarrow()
+    cols = sheet.map_columns(*(sheet.columns.values() if columns is None else columns))
+    table = sheet._merge_arrays(cols, prune)
+
+    fields = [("file", _strings)] if file is not None else []
+    for name, values in table.items():
+        if isinstance(values, pd.Categorical):
+            fields.append((name, _strings))
+        else:
+            # The merged columns' ordinals are "" outside their cells
+            fields.append((name, pa.int64()))
+    schema = pa.schema(fields)
+
+    def row_groups():
+        n = len(table["ordinal"])
+        for start in range(0, n, row_group_size):
+            rows = slice(start, start + row_group_size)
+            arrays = [_constant(file, len(table["ordinal"][rows]))] if file is not None else []
+            for values in table.values():
+                if isinstance(values, pd.Categorical):
+                    arrays.append(_dictionary(values.codes[rows], list(values.categories)))
+                elif values.dtype == object:
+                    chunk = values[rows].tolist()
+                    arrays.append(pa.array([None if v == "" else v for v in chunk], type=pa.int64()))
+                else:
+                    arrays.append(pa.array(values[rows], type=pa.int64()))
+            yield arrays
+
+    _write(path, schema, row_groups())
+
+
+def export_parquet(
+    paths,
+    out_dir,
+    partition_by="column",
+    merged=False,
+    columns=None,
+    row_group_size=ROW_GROUP_SIZE,
+    backend="arrays",
+    workers=None,
+    executor="process",
+    on_error=None,
+):
+    """
+    Convert many .opf/.json files to Parquet tables under out_dir, one
+    file at a time in a process or thread pool, as in load_many.
+
+    The cells of each file are written by write_cells to
+    out_dir/cells/<partitions>/<file name>.parquet, with a file field
+    holding the absolute path of the source. partition_by lists, outermost
+    first, "column", which writes each column to its own column=<name>
+    directory, and callables mapping a source path to a dict of partition
+    values, each written as a key=value directory:
+
+        pyvyu.export_parquet(paths, "export", ["column", lambda p: {"site": site_of(p)}])
+
+    merged=True also writes each file's merge_columns table to
+    out_dir/merged/<partitions>/<file name>.parquet, partitioned by the
+    callables only. Returns {source path: [written paths]}; files that fail
+    are passed to on_error(path, exception), by default logged, and
+    skipped. Needs pyarrow.
+
+    Sources with different codes or columns give files with different
+    schemas, so once all are written, the files of each table missing
+    fields of the others are rewritten with those fields null, in the
+    order of their first appearance. out_dir/cells and out_dir/merged then
+    each read as one dataset:
+
+        pyarrow.parquet.read_table("export/cells")
+
+    Files left in out_dir by earlier calls are not unified with these.
+    """
+
+    _require_pyarrow()
+    pools = {"process": ProcessPoolExecutor, "thread": ThreadPoolExecutor}
+    if executor not in pools:
+        raise AttributeError(f"Unknown executor: {executor}")
+
+    if partition_by is None:
+        partition_by = []
+    elif isinstance(partition_by, str) or callable(partition_by):
+        partition_by = [partition_by]
+    for part in partition_by:
+        if part != "column" and not callable(part):
+            raise AttributeError(f"Unknown partition: {part}")
+
+    paths = [os.path.abspath(p) for p in paths]
+    names = [os.path.basename(p) + ".parquet" for p in paths]
+    if len(set(names)) != len(names):
+        raise AttributeError("Files to export must have distinct names")
+
+    written = {}
+    with pools[executor](max_workers=workers) as pool:
+        futures = {}
+        for path, name in zip(paths, names):
+            # Partition values are computed here, so the callables need not pickle
+            parts = [
+                part if part == "column" else [f"{k}={quote(str(v), safe='')}" for k, v in part(path).items()]
+                for part in partition_by
+            ]
+            args = (path, name, out_dir, parts, merged, columns, row_group_size, backend)
+            futures[pool.submit(_export_one, *args)] = path
+
+        for future in as_completed(futures):
+            path = futures[future]
+            error = future.exception()
+            if error is None:
+                written[path] = future.result()
+            elif on_error is None:
+                log.warning("Can't export %s: %r", path, error)
+            else:
+                on_error(path, error)
+
+    for table in ("cells", "merged"):
+        prefix = os.path.join(out_dir, table) + os.sep
+        _unify([f for path in paths if path in written for f in written[path] if f.startswith(prefix)])
+    return written
+
+
+def _export_one(path, name, out_dir, parts, merged, columns, row_group_size, backend):
+    sheet = pv._load_one(path, columns, backend, False)
+    written = []
+
+    def directory(table, column=None):
+        dirs = [out_dir, table]
+        for part in parts:
+            if part != "column":
+                dirs += part
+            elif column is not None:
+                dirs.append(f"column={quote(column, safe='')}")
+        return os.path.join(*dirs)
+
+    if "column" in parts:
+        codes = _codes(sheet.columns.values())
+        for col in sheet.columns.values():
+            written.append(os.path.join(directory("cells", col.name), name))
+            write_cells(sheet, written[-1], [col], path, row_group_size, column_field=False, codes=codes)
+    else:
+        written.append(os.path.join(directory("cells"), name))
+        write_cells(sheet, written[-1], None, path, row_group_size)
+
+    if merged:
+        written.append(os.path.join(directory("merged"), name))
+        write_merged(sheet, written[-1], None, path, row_group_size)
+    return written
+
+
+def _unify(paths):
+    """
+    Rewrite the Parquet files among paths that lack fields of the others,
+    with those fields null, so that all have the unified schema.
+    """
+
+    schemas = [pq.read_schema(path) for path in paths]
+    if not schemas:
+        return
+    schema = pa.unify_schemas(schemas)
+    for path, own in zip(paths, schemas):
+        if own.equals(schema):
+            continue
+        with open(path, "rb") as f:
+            source = pq.ParquetFile(f)
+
+            def row_groups():
+                for i in range(source.num_row_groups):
+                    table = source.read_row_group(i)
+                    yield [
+                        table.column(field.name) if field.name in own.names else _nulls(field.type, table.num_rows)
+                        for field in schema
+                    ]
+
+            _write(path, schema, row_groups())
+
+
+def _write(path, schema, row_groups):
+    """Write row groups of arrays to path through a temporary file, replacing it at the end."""
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temp = os.path.join(directory, f".{os.path.basename(path)}.tmp")
+    writer = pq.ParquetWriter(temp, schema)
+    try:
+        for arrays in row_groups:
+            table = pa.Table.from_arrays(arrays, schema=schema)
+            writer.write_table(table, row_group_size=len(table))
+            count("rows", len(table))
+    except BaseException:
+        writer.close()
+        os.remove(temp)
+        raise
+    writer.close()
+    os.replace(temp, path)
+
+
+def _dictionary(keys, vocab):
+    """Dictionary array of int keys into vocab; negative keys are null."""
+
+    keys = np.asarray(keys, dtype=np.int32)
+    indices = pa.array(keys, mask=keys < 0, type=pa.int32())
+    return pa.DictionaryArray.from_arrays(indices, pa.array(vocab, type=pa.string()))
+
+
+def _nulls(type, n):
+    if pa.types.is_dictionary(type):
+        return _dictionary(np.full(n, -1, dtype=np.int32), [])
+    return pa.array([None] * n, type=type)
+
+
+def _codes(cols):
+    """The codes of cols, without repeats, in order."""
+
+    return list(dict.fromkeys(code for col in cols for code in col.codelist))
+
+
+def _constant(value, n):
+    return _dictionary(np.zeros(n, dtype=np.int32), [value])
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Parquet export needs pyarrow: pip install pyarrow")
@@ -0,0 +1,308 @@
+import hashlib
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from .. import pyvyu as pv
+from ..spreadsheet.Spreadsheet import Spreadsheet
+
+_schema = """
+PRAGMA foreign_keys = ON;
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS columns (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS codes (
+    id INTEGER PRIMARY KEY,
+    column_id INTEGER NOT NULL REFERENCES columns(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cells (
+    id INTEGER PRIMARY KEY,
+    column_id INTEGER NOT NULL REFERENCES columns(id) ON DELETE CASCADE,
+    ordinal INTEGER NOT NULL,
+    onset INTEGER NOT NULL,
+    offset INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cell_values (
+    cell_id INTEGER NOT NULL REFERENCES cells(id) ON DELETE CASCADE,
+    code_id INTEGER NOT NULL REFERENCES codes(id) ON DELETE CASCADE,
+    value TEXT NOT NULL,
+    PRIMARY KEY (cell_id, code_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS columns_by_name ON columns(name, file_id);
+CREATE INDEX IF NOT EXISTS columns_by_file ON columns(file_id);
+CREATE INDEX IF NOT EXISTS codes_by_column ON codes(column_id, name);
+CREATE INDEX IF NOT EXISTS cells_by_time ON cells(column_id, onset, offset);
+CREATE INDEX IF NOT EXISTS values_by_code ON cell_values(code_id, value);
+"""
+
+
+class CorpusIndex:
+    """
+    SQLite index of the cells of many .opf/.json files.
+
+    ingest() adds files to the database at path (":memory:" for a
+    throwaway one) and later re-indexes only files whose mtime or size
+    changed and whose content hash then differs. Cells are indexed by
+    column and time and by code value, so queries across a whole corpus
+    need no parsing:
+
+        corpus = CorpusIndex("study.db")
+        corpus.ingest(glob.glob("sessions/*.opf"))
+        corpus.query("ChildLook", where={"object": "toy"}, min_duration=2000)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_schema)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def ingest(self, paths, backend="arrays"):
+        """
+        Index new or changed files. Returns the paths, made absolute,
+        grouped as {"added": [...], "updated": [...], "unchanged": [...]}.
+        """
+
+        result = {"added": [], "updated": [], "unchanged": []}
+        for path in paths:
+            path = os.path.abspath(path)
+            st = os.stat(path)
+            row = self._db.execute(
+                "SELECT id, mtime_ns, size, hash FROM files WHERE path = ?", (path,)
+            ).fetchone()
+            if row is not None and row[1:3] == (st.st_mtime_ns, st.st_size):
+                result["unchanged"].append(path)
+                continue
+
+            digest = _file_hash(path)
+            with self._db:
+                if row is not None and row[3] == digest:
+                    self._db.execute(
+                        "UPDATE files SET mtime_ns = ?, size = ? WHERE id = ?",
+                        (st.st_mtime_ns, st.st_size, row[0]),
+                    )
+                    result["unchanged"].append(path)
+                    continue
+
+                if row is not None:
+                    self._db.execute("DELETE FROM files WHERE id = ?", (row[0],))
+                file_id = self._db.execute(
+                    "INSERT INTO files (path, mtime_ns, size, hash) VALUES (?, ?, ?, ?)",
+                    (path, st.st_mtime_ns, st.st_size, digest),
+                ).lastrowid
+                self._insert_sheet(file_id, _load(path, backend))
+            result["added" if row is None else "updated"].append(path)
+        return result
+
+    def remove(self, paths):
+        """Drop files from the index."""
+
+        with self._db:
+            self._db.executemany(
+                "DELETE FROM files WHERE path = ?", [(os.path.abspath(p),) for p in paths]
+            )
+
+    def prune(self):
+        """Drop files that no longer exist on disk; returns their paths."""
+
+        gone = [p for p in self.paths() if not os.path.exists(p)]
+        self.remove(gone)
+        return gone
+
+    def paths(self):
+        """Paths of the indexed files."""
+
+        return [p for (p,) in self._db.execute("SELECT path FROM files ORDER BY path")]
+
+    def query(self, column, where=None, during=None, min_duration=None, max_duration=None, files=None):
+        """
+        DataFrame of the cells of column, in any indexed file, matching all
+        the given conditions, with file, ordinal, onset, offset and code
+        columns, ordered by file and onset.
+
+        where maps codes to a value, or to a predicate called once per
+        distinct indexed value of the code, as in Column.query. during is
+        an (onset, offset) interval the cells must overlap, min_duration and
+        max_duration bound offset - onset in milliseconds, and files
+        restricts the search to those paths.
+        """
+
+        sql, params = self._match(column, where, during, min_duration, max_duration, files)
+        cells = pd.read_sql_query(
+            f"SELECT f.path AS file, c.id, c.ordinal, c.onset, c.offset {sql}"
+            " ORDER BY f.path, c.onset, c.id",
+            self._db,
+            params=params,
+        )
+        values = pd.read_sql_query(
+            "SELECT v.cell_id AS id, k.name AS code, v.value FROM cell_values v"
+            " JOIN codes k ON k.id = v.code_id"
+            f" WHERE v.cell_id IN (SELECT c.id {sql})",
+            self._db,
+            params=params,
+        )
+        codes = [
+            name
+            for (name,) in self._db.execute(
+                "SELECT DISTINCT k.name FROM codes k JOIN columns col ON col.id = k.column_id"
+                " WHERE col.name = ? ORDER BY k.position",
+                (column,),
+            )
+        ]
+
+        table = values.pivot(index="id", columns="code", values="value")
+        cells = cells.join(table.reindex(columns=codes), on="id")
+        cells[codes] = cells[codes].fillna("")
+        return cells.drop(columns="id").reset_index(drop=True)
+
+    def sheets(self, column, where=None, during=None, min_duration=None, max_duration=None, files=None, backend="cells"):
+        """
+        Yield (path, Spreadsheet) for each file with cells matching query(),
+        each sheet holding one column of just those cells. Sheets are built
+        one at a time as the generator advances.
+        """
+
+        df = self.query(column, where, during, min_duration, max_duration, files)
+        for path, cells in df.groupby("file", sort=False):
+            sheet = Spreadsheet(backend)
+            cells = cells.drop(columns="file").set_index("ordinal")
+            sheet.columns[column] = Spreadsheet.backends[backend].from_dataframe(cells, column)
+            yield path, sheet
+
+    def load(self, path, columns=None, backend="cells"):
+        """Rebuild the Spreadsheet of an indexed file without parsing it."""
+
+        file_id = self._db.execute(
+            "SELECT id FROM files WHERE path = ?", (os.path.abspath(path),)
+        ).fetchone()
+        if file_id is None:
+            raise KeyError(f"Not indexed: {path}")
+
+        sheet = Spreadsheet(backend)
+        for column_id, name in self._db.execute(
+            "SELECT id, name FROM columns WHERE file_id = ? ORDER BY position", file_id
+        ).fetchall():
+            if columns is not None and name not in columns:
+                continue
+            codes = self._db.execute(
+                "SELECT id, name FROM codes WHERE column_id = ? ORDER BY position", (column_id,)
+            ).fetchall()
+            cells = self._db.execute(
+                "SELECT id, ordinal, onset, offset FROM cells WHERE column_id = ? ORDER BY id",
+                (column_id,),
+            ).fetchall()
+            values = {}
+            for code_id, code in codes:
+                values[code] = [
+                    v
+                    for (v,) in self._db.execute(
+                        "SELECT value FROM cell_values WHERE code_id = ? ORDER BY cell_id",
+                        (code_id,),
+                    )
+                ]
+            _, ordinals, onsets, offsets = zip(*cells) if cells else ((), (), (), ())
+            col = sheet.new_column(name, *[code for _, code in codes])
+            col.extend(onsets, offsets, values, ordinals)
+        return sheet
+
+    def _match(self, column, where, during, min_duration, max_duration, files):
+        """FROM and WHERE clauses selecting the cells of a query, with their parameters."""
+
+        sql = (
+            "FROM cells c JOIN columns col ON col.id = c.column_id"
+            " JOIN files f ON f.id = col.file_id WHERE col.name = ?"
+        )
+        params = [column]
+        if during is not None:
+            sql += " AND c.onset <= ? AND c.offset >= ?"
+            params += [int(during[1]), int(during[0])]
+        if min_duration is not None:
+            sql += " AND c.offset - c.onset >= ?"
+            params.append(int(min_duration))
+        if max_duration is not None:
+            sql += " AND c.offset - c.onset <= ?"
+            params.append(int(max_duration))
+        if files is not None:
+            files = [os.path.abspath(p) for p in files]
+            sql += f" AND f.path IN ({','.join('?' * len(files))})"
+            params += files
+
+        for code, condition in (where or {}).items():
+            codes = (
+                "SELECT k.id FROM codes k JOIN columns col ON col.id = k.column_id"
+                " WHERE col.name = ? AND k.name = ?"
+            )
+            if callable(condition):
+                distinct = self._db.execute(
+                    f"SELECT DISTINCT value FROM cell_values WHERE code_id IN ({codes})",
+                    (column, code),
+                )
+                accepted = [v for (v,) in distinct if condition(v)]
+            else:
+                accepted = [condition]
+            sql += (
+                " AND c.id IN (SELECT cell_id FROM cell_values"
+                f" WHERE code_id IN ({codes}) AND value IN ({','.join('?' * len(accepted))}))"
+            )
+            params += [column, code] + accepted
+        return sql, params
+
+    def _insert_sheet(self, file_id, sheet):
+        (next_cell,) = self._db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM cells").fetchone()
+        for position, col in enumerate(sheet.columns.values()):
+            column_id = self._db.execute(
+                "INSERT INTO columns (file_id, position, name) VALUES (?, ?, ?)",
+                (file_id, position, col.name),
+            ).lastrowid
+
+            ordinals, onsets, offsets, codes = col._columnar()
+            ids = np.arange(next_cell, next_cell + len(ordinals)).tolist()
+            next_cell += len(ids)
+            self._db.executemany(
+                "INSERT INTO cells (id, column_id, ordinal, onset, offset) VALUES (?, ?, ?, ?, ?)",
+                zip(ids, [column_id] * len(ids), ordinals.tolist(), onsets.tolist(), offsets.tolist()),
+            )
+            for code_pos, code in enumerate(col.codelist):
+                code_id = self._db.execute(
+                    "INSERT INTO codes (column_id, position, name) VALUES (?, ?, ?)",
+                    (column_id, code_pos, code),
+                ).lastrowid
+                keys, vocab = codes[code]
+                self._db.executemany(
+                    "INSERT INTO cell_values (cell_id, code_id, value) VALUES (?, ?, ?)",
+                    zip(ids, [code_id] * len(ids), [vocab[k] for k in keys.tolist()]),
+                )
+
+
+def _load(path, backend):
+    if path.endswith(".json"):
+        return pv.load_json(path, backend)
+    return pv.load_opf(path, backend)
+
+
+def _file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,105 @@
+import functools
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+# Stats objects collecting events; profiling is off while this is empty
+_active = []
+_running = threading.local()
+
+
+class Stats:
+    """
+    Timers and counters gathered inside a profile() block.
+
+    timers maps each stage (load, parse, cells, merge, to_df, save) to the
+    seconds spent in it and calls to how many times it ran. Stages nest, so
+    parse time is also part of load time. counters holds the totals of
+    lines parsed, bytes decompressed, cells created, merge intervals
+    visited and Parquet rows written. callback, if given, is called as
+    callback(kind, name, value) for every stage run ("time") and count
+    ("count") as it is recorded.
+    """
+
+    def __init__(self, callback=None):
+        self.timers = {}
+        self.calls = {}
+        self.counters = {}
+        self.callback = callback
+
+    def add_time(self, stage, seconds):
+        self.timers[stage] = self.timers.get(stage, 0.0) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+        if self.callback is not None:
+            self.callback("time", stage, seconds)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+        if self.callback is not None:
+            self.callback("count", name, n)
+
+    def __repr__(self):
+        stages = ", ".join(
+            f"{stage}={seconds:.4f}s/{self.calls[stage]}" for stage, seconds in self.timers.items()
+        )
+        counters = ", ".join(f"{name}={n}" for name, n in self.counters.items())
+        return f"Stats({stages}; {counters})"
+
+
+@contextmanager
+def profile(callback=None):
+    """
+    Collect stage timers and counters of pyvyu calls made in the block.
+
+        with pyvyu.profile() as stats:
+            sheet = pyvyu.load_opf("file.opf")
+        print(stats.timers, stats.counters)
+
+    Blocks may nest; every active Stats receives the events.
+    """
+
+    stats = Stats(callback)
+    _active.append(stats)
+    try:
+        yield stats
+    finally:
+        _active.remove(stats)
+
+
+def timed(stage):
+    """
+    Decorator recording the run time of a function as stage while profiling.
+    Calls made while the same stage is already running are not counted again.
+    """
+
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _active:
+                return func(*args, **kwargs)
+
+            stages = _running.__dict__.setdefault("stages", set())
+            if stage in stages:
+                return func(*args, **kwargs)
+
+            stages.add(stage)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                seconds = perf_counter() - start
+                stages.discard(stage)
+                for stats in list(_active):
+                    stats.add_time(stage, seconds)
+
+        return wrapper
+
+    return decorate
+
+
+def count(name, n=1):
+    """Add n to a counter of every active Stats."""
+
+    for stats in _active:
+        stats.count(name, n)
+
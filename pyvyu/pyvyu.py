@@ -1,12 +1,27 @@
 import zipfile
+import io
+import copy
+import struct
+import stat
+import shutil
+import sys
 import re
 import logging as log
 import tempfile
 import os
 import json
 import numbers
-from math import floor
+import numpy as np
+import pandas as pd
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from .spreadsheet.Spreadsheet import Spreadsheet
+from .spreadsheet.SpreadsheetWindow import SpreadsheetWindow
+from .cache.SheetCache import SheetCache
+from .index.CorpusIndex import CorpusIndex
+from .export.Parquet import export_parquet
+from .profiling.Stats import Stats, profile, timed as _timed, count as _count
 
 _line_formats = {
     "column": re.compile(r"(?P<colname>\w+)\s\(.*\)\-(?P<codes>.*)"),
@@ -27,84 +42,532 @@ def _parse_line(line):
     return None, None
 
 
-def load_json(filename):
+@_timed("load")
+def load_json(filename, backend="cells", columns=None, window=None, shift=True):
+    """
+    Load a Spreadsheet saved with save_json.
+
+    columns and window restrict what is built, as in load_opf.
+    """
+
+    _check_window(window)
+    if _cache is not None and isinstance(filename, (str, os.PathLike)):
+        sheet = _cache.load(filename, _load_json, backend, columns, window, shift)
+    else:
+        sheet = _load_json(filename, backend, columns, window, shift)
+    return _mark_saved(sheet, sheet.columns)
+
+
+@_timed("parse")
+def _load_json(filename, backend="cells", columns=None, window=None, shift=True):
     with open(filename, "r") as jf:
-        sheet = Spreadsheet()
-        col = None
-        ordinal_counter = 1
+        sheet = Spreadsheet(backend)
 
-        json_sheet = json.load(jf)
-        for column in json_sheet["passes"]:
+        # Passes are decoded one at a time, so only one column's cells are
+        # held as JSON objects at once
+        for column in _iter_passes(jf):
             codes = column["arguments"]
             cells = column["cells"]
             name = column["name"]
-            coltype = column["type"]
+
+            if columns is not None and name not in columns:
+                continue
 
             col = sheet.new_column(name, *codes)
-            log.debug(
-                f"Created column {col.name} with code(s): %s\n",
-                ", ".join(col.codelist),
+            log.debug("Created column %s with code(s): %s", col.name, ", ".join(col.codelist))
+
+            _fill_column(
+                col,
+                [cell["id"] for cell in cells],
+                to_millis([cell["onset"] for cell in cells]),
+                to_millis([cell["offset"] for cell in cells]),
+                [cell["values"] for cell in cells],
+                window,
+                shift,
             )
-
-            for cell in cells:
-                ordinal = cell["id"]
-                onset = cell["onset"]
-                offset = cell["offset"]
-                values = cell["values"]
-                cell = col.new_cell(
-                    ordinal=ordinal,
-                    onset=to_millis(onset),
-                    offset=to_millis(offset),
-                    *values,
-                )
-                log.debug(f"New cell: {cell}\n")
         return sheet
 
 
-def load_opf(filename):
-    """Extract data from a .opf file and return a Spreadsheet"""
+class _JsonStream:
+    """Text stream read in blocks and decoded one JSON token or value at a time."""
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, stream, block_size=1 << 20):
+        self.stream = stream
+        self.block_size = block_size
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def _read(self):
+        # Drop what was decoded already and append the next block
+        block = self.stream.read(self.block_size)
+        _count("bytes", len(block))
+        self.text = self.text[self.pos :] + block
+        self.pos = 0
+        self.eof = not block
+
+    def peek(self):
+        """Next non-whitespace character, "" at the end of the stream."""
+
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.text) or self.eof:
+                return self.text[self.pos : self.pos + 1]
+            self._read()
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in JSON at {self.pos}, found {found!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete value, reading more of the stream until it is."""
+
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.text, self.pos)
+            except ValueError:
+                if self.eof:
+                    raise
+            else:
+                # A number running to the end of the text may continue
+                if end < len(self.text) or self.eof:
+                    self.pos = end
+                    return value
+            # Grow the blocks so a large value is not decoded over and over
+            self.block_size = max(self.block_size, len(self.text) - self.pos)
+            self._read()
+
+
+def _iter_passes(stream, block_size=1 << 20):
+    """Yield the pass objects of a save_json file as each is read from stream."""
+
+    tokens = _JsonStream(stream, block_size)
+    tokens.expect("{")
+    while tokens.peek() != "}":
+        key = tokens.value()
+        tokens.expect(":")
+        if key != "passes":
+            tokens.value()
+        else:
+            tokens.expect("[")
+            while tokens.peek() != "]":
+                yield tokens.value()
+                if tokens.peek() != "]":
+                    tokens.expect(",")
+            tokens.expect("]")
+        if tokens.peek() != "}":
+            tokens.expect(",")
+    tokens.expect("}")
+
+
+@_timed("load")
+def load_opf(filename, backend="cells", columns=None, window=None, shift=True):
+    """
+    Extract data from a .opf file and return a Spreadsheet.
 
+    backend selects the column storage: "cells" keeps a Cell object per
+    annotation, "arrays" stores columns as NumPy arrays (see ArrayColumn).
+
+    columns, a list of column names, restricts loading to those columns; the
+    cell lines of other columns are skipped undecoded. window, an
+    (onset, offset) pair, keeps only the cells in that time range, clipped
+    and optionally shifted like trim_sheet.
+    """
+
+    _check_window(window)
+    if _cache is not None and isinstance(filename, (str, os.PathLike)):
+        sheet = _cache.load(filename, _load_opf, backend, columns, window, shift)
+    else:
+        sheet = _load_opf(filename, backend, columns, window, shift)
+    return _mark_saved(sheet, sheet.columns)
+
+
+def _load_opf(filename, backend="cells", columns=None, window=None, shift=True):
     with zipfile.ZipFile(filename, "r") as zf:
         assert "db" in zf.namelist()
 
         # Open the db file
         with zf.open("db") as db:
-            sheet = Spreadsheet()
-            col = None
-            ordinal_counter = 1
-
-            for line_num, line in enumerate(db):
-                line_stripped = line.strip().decode("utf8")
-
-                # Check type of line
-                line_type, match = _parse_line(line_stripped)
-                if line_type == "column":
-                    codes = [x.split("|")[0] for x in match.group("codes").split(",")]
-                    log.debug(f"Stripped line: {line_stripped}\n")
-
-                    # Create new column
-                    col = sheet.new_column(match.group("colname"), *codes)
-                    log.debug(
-                        f"Created column {col.name} with code(s): %s\n",
-                        ", ".join(col.codelist),
-                    )
-
-                    ordinal_counter = 1
-
-                elif line_type == "cell":
-                    values = match.group("values").split(",")
-                    cell = col.new_cell(
-                        ordinal=ordinal_counter,
-                        onset=to_millis(match.group("onset")),
-                        offset=to_millis(match.group("offset")),
-                        *values,
-                    )
-                    ordinal_counter += 1
-                    log.debug(f"New cell: {cell}\n")
-                else:
-                    log.warning("Can't parse line %d: %s\n", line_num, line_stripped)
+            sheet = Spreadsheet(backend)
+            _parse_db(_read_lines(db), sheet, columns, window, shift)
+    return sheet
+
+
+# One cell as yielded by iter_opf and iter_json, times in milliseconds
+CellRecord = namedtuple("CellRecord", ["column", "ordinal", "onset", "offset", "values"])
+
+
+def iter_opf(filename, columns=None, chunk=4096):
+    """
+    Yield the cells of a .opf file as CellRecords without building a
+    Spreadsheet. values lists the code values in the column's code order.
+
+    The db member is read in blocks and its timestamps converted chunk cells
+    at a time, so memory use stays the same whatever the size of the file.
+    columns restricts the records to those columns, as in load_opf.
+    """
+
+    with zipfile.ZipFile(filename, "r") as zf:
+        with zf.open("db") as db:
+            for kind, first, second in _iter_db(_read_lines(db), columns, chunk):
+                if kind == "column":
+                    name, ordinal = first, 1
+                    continue
+                for (onset, offset), values in zip(first.tolist(), second):
+                    yield CellRecord(name, ordinal, onset, offset, _split_values(values.decode("utf8")))
+                    ordinal += 1
+
+
+def iter_json(filename, columns=None):
+    """
+    Yield the cells of a file saved with save_json as CellRecords, as
+    iter_opf does for .opf files. The file is decoded one pass at a time.
+    """
+
+    with open(filename, "r") as jf:
+        for column in _iter_passes(jf):
+            name = column["name"]
+            if columns is not None and name not in columns:
+                continue
+            for cell in column["cells"]:
+                yield CellRecord(
+                    name, cell["id"], to_millis(cell["onset"]), to_millis(cell["offset"]), cell["values"]
+                )
+
+
+_cache = None
+
+
+def enable_cache(directory=None, max_bytes=1 << 30, key="stat"):
+    """
+    Cache parsed sheets on disk so load_opf and load_json can skip parsing
+    unchanged files. Returns the SheetCache, whose stats() reports hits and
+    misses. The default directory is ~/.cache/pyvyu.
+    """
+
+    global _cache
+    if directory is None:
+        directory = os.path.join(os.path.expanduser("~"), ".cache", "pyvyu")
+    _cache = SheetCache(directory, max_bytes, key)
+    return _cache
+
+
+def disable_cache():
+    global _cache
+    _cache = None
+
+
+def load_many(
+    paths,
+    workers=None,
+    columns=None,
+    executor="process",
+    backend="cells",
+    as_df=False,
+    on_error=None,
+):
+    """
+    Load many .opf/.json files in parallel.
+
+    Returns a dict of Spreadsheets keyed by path or, with as_df=True, one
+    long-format DataFrame from Spreadsheet.to_df indexed by (file, ordinal),
+    both in the order of paths.
+    Files that fail to load are passed to on_error(path, exception), which
+    by default logs a warning, and left out of the result.
+    """
+
+    paths = list(paths)
+    loaded = {}
+    for path, result, error in iter_many(paths, workers, columns, executor, backend, as_df):
+        if error is not None:
+            if on_error is None:
+                log.warning("Can't load %s: %r", path, error)
+            else:
+                on_error(path, error)
+            continue
+        loaded[path] = result
+
+    # Files finish in any order; keep the order they were given in
+    sheets = {path: loaded[path] for path in paths if path in loaded}
+    if not as_df:
+        return sheets
+    if not sheets:
+        return pd.DataFrame()
+    return pd.concat(sheets.values(), keys=list(sheets), names=["file"])
+
+
+def iter_many(paths, workers=None, columns=None, executor="process", backend="cells", as_df=False):
+    """
+    Load files in a process or thread pool, yielding (path, result, error)
+    as each one finishes. result is a Spreadsheet, or its to_df() if as_df,
+    and error the exception raised while loading, if any.
+    """
+
+    pools = {"process": ProcessPoolExecutor, "thread": ThreadPoolExecutor}
+    if executor not in pools:
+        raise AttributeError(f"Unknown executor: {executor}")
+
+    with pools[executor](max_workers=workers) as pool:
+        futures = {
+            pool.submit(_load_one, path, columns, backend, as_df): path for path in paths
+        }
+        for future in as_completed(futures):
+            error = future.exception()
+            yield futures[future], None if error else future.result(), error
+
+
+def _load_one(path, columns, backend, as_df):
+    if str(path).endswith(".json"):
+        sheet = load_json(path, backend, columns)
+    else:
+        sheet = load_opf(path, backend, columns)
+    return sheet.to_df() if as_df else sheet
+
+
+def _check_window(window):
+    if window is not None and window[0] > window[1]:
+        raise AttributeError("the Onset cannot be greater than the Offset")
+
+
+def _read_lines(stream, block_size=1 << 20):
+    """Read a byte stream in large blocks and yield its stripped, undecoded lines."""
+
+    tail = b""
+    size = 0
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        size += len(block)
+        lines = (tail + block).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line.strip()
+    if tail:
+        yield tail.strip()
+    _count("bytes", size)
+
+
+@_timed("parse")
+def _parse_db(lines, sheet, columns=None, window=None, shift=True):
+    """
+    Fill sheet from the lines of an .opf db stream, adding the cells of
+    each column in bulk as _iter_db hands them over.
+    """
+
+    col = None
+    for kind, first, second in _iter_db(lines, columns):
+        if kind == "column":
+            col = sheet.new_column(first, *second)
+            ordinal = 1
+            log.debug("Created column %s with code(s): %s", col.name, ", ".join(col.codelist))
+            continue
+
+        _fill_column(
+            col,
+            range(ordinal, ordinal + len(first)),
+            first[:, 0],
+            first[:, 1],
+            second,
+            window,
+            shift,
+        )
+        ordinal += len(first)
     return sheet
 
+
+def _iter_db(lines, columns=None, chunk=None):
+    """
+    Walk the lines of an .opf db stream, yielding ("column", name, codes)
+    at each column header and ("cells", millis, rows) batches of its cells:
+    an (n, 2) int64 array of onsets and offsets and the raw bytes of their
+    value lists. A batch holds up to chunk cells, or the whole column if
+    chunk is None.
+
+    Cell lines are recognised by their fixed-width timestamps and converted
+    a batch at a time in one vectorized pass. Anything else is decoded and
+    goes through _parse_line. Cell lines of columns not in columns are
+    skipped.
+    """
+
+    name = None
+    skip = True
+    stamps, rows = [], []
+
+    def flush():
+        millis = _fixed_millis_array(stamps)
+        valid = millis[:, 0] >= 0
+        if valid.all():
+            return millis, rows
+        for row in np.flatnonzero(~valid):
+            log.warning("Can't parse cell of column %s: %s", name, stamps[row])
+        return millis[valid], [values for values, ok in zip(rows, valid) if ok]
+
+    line_num = -1
+    for line_num, line in enumerate(lines):
+        # Fast path: "HH:MM:SS:mmm,HH:MM:SS:mmm,(values)"
+        if (
+            len(line) > 26
+            and line[12] == _COMMA
+            and line[25] == _COMMA
+            and line[26] == _OPEN
+            and line[-1] == _CLOSE
+        ):
+            if not skip:
+                stamps.append(line[:25])
+                rows.append(line[27:-1])
+                if len(stamps) == chunk:
+                    yield ("cells",) + flush()
+                    stamps, rows = [], []
+            continue
+
+        # Check type of line
+        line = line.decode("utf8")
+        line_type, match = _parse_line(line)
+        if line_type == "column":
+            if stamps:
+                yield ("cells",) + flush()
+                stamps, rows = [], []
+            name = match.group("colname")
+            skip = columns is not None and name not in columns
+            if not skip:
+                codes = [x.split("|")[0] for x in _split_values(match.group("codes"))]
+                yield "column", name, codes
+
+        elif line_type == "cell":
+            if not skip:
+                stamps.append(f"{match.group('onset')},{match.group('offset')}".encode())
+                rows.append(match.group("values").encode("utf8"))
+                if len(stamps) == chunk:
+                    yield ("cells",) + flush()
+                    stamps, rows = [], []
+        elif line.startswith("#"):
+            log.debug("File version: %s", line)
+        elif line:
+            log.warning("Can't parse line %d: %s\n", line_num, line)
+    if stamps:
+        yield ("cells",) + flush()
+    _count("lines", line_num + 1)
+
+
+_COMMA, _OPEN, _CLOSE = b",()"
+
+
+def _fill_column(col, ordinals, onsets, offsets, rows, window=None, shift=True):
+    """
+    Add parsed cells to col in bulk. Cells outside window are dropped before
+    their values are touched; the rest are clipped and shifted as in trim.
+    Raw bytes rows are decoded and split here.
+    """
+
+    onsets = np.asarray(onsets, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if window is not None:
+        keep, onsets, offsets = _apply_window(onsets, offsets, window, shift)
+        ordinals = [o for o, k in zip(ordinals, keep) if k]
+        rows = [r for r, k in zip(rows, keep) if k]
+
+    rows = [
+        _split_values(r.decode("utf8")) if isinstance(r, bytes) else list(r)
+        for r in rows
+    ]
+    col._fill(ordinals, onsets.tolist(), offsets.tolist(), rows)
+
+
+def _apply_window(onsets, offsets, window, shift=True):
+    """
+    Select the intervals overlapping window and clip (and optionally shift)
+    them to it, as Column.trim does. Returns (keep mask, onsets, offsets).
+    """
+
+    start, stop = window
+    keep = (onsets <= stop) & (offsets >= start)
+    onsets = np.maximum(onsets[keep], start)
+    offsets = np.minimum(offsets[keep], stop)
+    if shift:
+        onsets = np.maximum(onsets - start, 0)
+        offsets = np.maximum(offsets - start, 0)
+    return keep, onsets, offsets
+
+
+def _fixed_millis_array(stamps):
+    """
+    Convert b"HH:MM:SS:mmm,HH:MM:SS:mmm" strings to an (n, 2) int64 array of
+    milliseconds. Malformed rows come back as -1.
+    """
+
+    chars = np.array(stamps, dtype="S25").view(np.uint8).reshape(-1, 25)
+    onsets, valid = _fixed_width_millis(chars, 0)
+    offsets, valid_offsets = _fixed_width_millis(chars, 13)
+    millis = np.stack((onsets, offsets), axis=1)
+    millis[~(valid & valid_offsets)] = -1
+    return millis
+
+
+_digit_columns = np.array([0, 1, 3, 4, 6, 7, 9, 10, 11])
+_colon_columns = np.array([2, 5, 8])
+
+
+def _split_values(text):
+    """
+    Split a comma separated value list, honouring backslash escapes. Commas
+    inside a value wrapped in double quotes do not split it; the quotes are
+    kept as part of the value.
+    """
+
+    if "\\" not in text and '"' not in text:
+        return text.split(",")
+
+    values = []
+    current = []
+    quoted = False
+    pos, end = 0, len(text)
+    while pos < end:
+        ch = text[pos]
+        if ch == "\\":
+            current.append(text[pos + 1 : pos + 2])
+            pos += 2
+            continue
+        if ch == '"':
+            if not quoted and not current:
+                quoted = _closes_quote(text, pos + 1)
+            elif quoted and text[pos + 1 : pos + 2] in ("", ","):
+                quoted = False
+        if ch == "," and not quoted:
+            values.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+        pos += 1
+    values.append("".join(current))
+    return values
+
+
+def _closes_quote(text, pos):
+    """Whether a quote at or after pos ends a value; an unmatched quote is literal."""
+
+    while pos < len(text):
+        if text[pos] == "\\":
+            pos += 2
+        elif text[pos] == '"' and text[pos + 1 : pos + 2] in ("", ","):
+            return True
+        else:
+            pos += 1
+    return False
+
+
+def _escape_value(value):
+    """Escape a code value for the .opf db format."""
+
+    return value.replace("\\", "\\\\").replace(",", "\\,")
+
+
 def trim_sheet(onset, offset, sheet, shift, remove_empty, *columns):
     if onset > offset:
         raise AttributeError('the Onset cannot be greater than the Offset')
@@ -120,75 +583,331 @@ def trim_sheet(onset, offset, sheet, shift, remove_empty, *columns):
     return sheet
 
 
+def extract_epochs(sheet, windows, columns=None, shift=True, as_df=False):
+    """
+    Cut many time windows out of a sheet at once.
+
+    windows is a sequence of (onset, offset) pairs, or a column (or column
+    name) whose cells, in ordinal order, give the windows. The cells of each
+    column overlapping every window are found in one batched search of the
+    column's interval index.
+
+    Returns a list of read-only SpreadsheetWindow views, one per window and
+    each trimmed as by trim_sheet; call materialize() on one for an
+    independent copy. With as_df=True, returns what their to_df() frames
+    would be, stacked into one DataFrame indexed by (epoch, ordinal) with
+    epochs numbered in window order, computed in a single merge.
+    """
+
+    if isinstance(windows, str):
+        windows = sheet.get_column(windows)
+    if hasattr(windows, "sorted_cells"):
+        windows = [(c.onset, c.offset) for c in windows.sorted_cells()]
+
+    bounds = np.asarray(windows, dtype=np.int64).reshape(-1, 2)
+    onsets, offsets = bounds[:, 0], bounds[:, 1]
+    if np.any(onsets > offsets):
+        raise AttributeError('the Onset cannot be greater than the Offset')
+
+    if columns is None:
+        columns = sheet.get_column_list()
+    if as_df:
+        if len(bounds) == 0:
+            return pd.DataFrame()
+        return sheet._merge_epochs(sheet.map_columns(*columns), onsets, offsets, shift)
+
+    positions = [{} for _ in range(len(bounds))]
+    for name in columns:
+        epochs, pos = sheet.get_column(name).index.positions_in_ranges(onsets, offsets)
+        splits = np.searchsorted(epochs, np.arange(len(bounds) + 1))
+        for i in range(len(bounds)):
+            positions[i][name] = pos[splits[i] : splits[i + 1]]
+
+    return [
+        SpreadsheetWindow(sheet, onset, offset, shift, columns, found)
+        for onset, offset, found in zip(onsets.tolist(), offsets.tolist(), positions)
+    ]
+
+
 def to_millis(timestamp):
+    """
+    Convert a HH:MM:SS:mmm timestamp to milliseconds; numbers pass through.
+
+    Lists, tuples, NumPy arrays and pandas Series are converted in one
+    vectorized pass and returned as an int64 array.
+    """
+
+    if isinstance(timestamp, str):
+        return _millis(timestamp)
     if isinstance(timestamp, numbers.Number):
         return timestamp
-    ms = 0
-    factors = [1, 60, 60, 1000]
-    parts = timestamp.split(":")
-    for factor, part in zip(factors, parts):
-        ms *= factor
-        ms += int(part)
+    return _millis_array(timestamp)
+
+
+def to_timestamp(millis):
+    """
+    Convert milliseconds to a HH:MM:SS:mmm timestamp.
+
+    Lists, tuples, NumPy arrays and pandas Series are converted in one
+    vectorized pass and returned as an array of str.
+    """
 
-    log.debug(f"{timestamp} converted to: {ms}")
+    if isinstance(millis, numbers.Number):
+        return _timestamp(millis)
+    return _timestamp_array(millis)
+
+
+def set_timestamp_cache(maxsize=4096):
+    """
+    Memoize scalar to_millis/to_timestamp conversions in bounded LRU caches,
+    which pays off when the same times repeat. maxsize=0 turns caching off.
+    """
+
+    global _millis, _timestamp
+    if maxsize:
+        _millis = lru_cache(maxsize)(_parse_timestamp)
+        _timestamp = lru_cache(maxsize)(_format_timestamp)
+    else:
+        _millis = _parse_timestamp
+        _timestamp = _format_timestamp
+
+
+def _parse_timestamp(timestamp):
+    ms = 0
+    for factor, part in zip((1, 60, 60, 1000), timestamp.split(":")):
+        ms = ms * factor + int(part)
     return ms
 
 
-def to_timestamp(millis):
-    factors = [1000, 60, 60, 24]
-    ms = millis
-    parts = []
-    for factor in factors:
-        parts.append(ms % factor)
-        ms = floor(ms / factor)
-    parts.reverse()
-
-    ts = "{:02d}:{:02d}:{:02d}:{:03d}".format(*parts)
-    log.debug(f"{millis} converted to: {ts}")
-    return ts
-
-def save_json(sheet, filename, *columns):
-    with open(filename, "w") as outfile:
-        json.dump(sheet._to_json(), outfile, indent=4)
+def _format_timestamp(millis):
+    s, ms = divmod(millis, 1000)
+    m, s = divmod(s, 60)
+    h, m = divmod(m, 60)
+    return f"{h % 24:02d}:{m:02d}:{s:02d}:{ms:03d}"
 
-def save_opf(sheet, filename, overwrite_project=False, *columns):
+
+_millis = _parse_timestamp
+_timestamp = _format_timestamp
+
+
+def _millis_array(timestamps):
+    values = np.asarray(timestamps)
+    if values.dtype.kind in "iu":
+        return values.astype(np.int64)
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    if values.dtype.kind in "OU" and all(isinstance(v, str) for v in values.tolist()):
+        values = values.astype("U")
+    if values.dtype.kind == "U" and values.dtype.itemsize == 12 * 4:
+        chars = values.astype("S12").view(np.uint8).reshape(-1, 12)
+        millis, valid = _fixed_width_millis(chars, 0)
+        if valid.all():
+            return millis
+
+    return np.fromiter((to_millis(v) for v in values.tolist()), np.int64, len(values))
+
+
+def _timestamp_array(millis):
+    millis = np.asarray(millis, dtype=np.int64)
+    fields = (
+        (millis // 3_600_000 % 24, (0, 1)),
+        (millis // 60_000 % 60, (3, 4)),
+        (millis // 1000 % 60, (6, 7)),
+        (millis % 1000, (9, 10, 11)),
+    )
+    chars = np.full((len(millis), 12), ord(":"), dtype=np.uint8)
+    for value, positions in fields:
+        for place, col in enumerate(reversed(positions)):
+            chars[:, col] = value // 10 ** place % 10 + ord("0")
+    return chars.view("S12").ravel().astype("U12")
+
+
+def _fixed_width_millis(chars, start):
     """
-    Save sheet to file. For existing zip files, need to recreate the whole thing.
-    See: https://stackoverflow.com/questions/25738523
+    Milliseconds of the HH:MM:SS:mmm timestamps in columns start..start+11
+    of a uint8 character matrix, and a mask of the well-formed rows.
+    """
+
+    d = chars[:, start : start + 12].astype(np.int64) - ord("0")
+    valid = np.all((d[:, _digit_columns] >= 0) & (d[:, _digit_columns] <= 9), axis=1)
+    valid &= np.all(chars[:, start + _colon_columns] == ord(":"), axis=1)
+    millis = (
+        (d[:, 0] * 10 + d[:, 1]) * 3_600_000
+        + (d[:, 3] * 10 + d[:, 4]) * 60_000
+        + (d[:, 6] * 10 + d[:, 7]) * 1000
+        + d[:, 9] * 100
+        + d[:, 10] * 10
+        + d[:, 11]
+    )
+    return millis, valid
+
+
+@_timed("save")
+def save_json(sheet, filename, *columns, compact=False, millis=False):
+    """
+    Save sheet, or the given columns of it, as JSON. As in save_opf, small
+    columns unmodified since their last save are not serialized again.
+
+    compact leaves out all indentation and whitespace, and millis writes
+    onsets and offsets as integer milliseconds instead of timestamps;
+    load_json reads either. Passes are written one at a time, rendered a
+    chunk of cells at a time, never as one document in memory.
     """
 
     if len(columns) == 0:
         columns = sheet.columns.keys()
 
-    # make copy
-    if os.path.exists(filename) and not overwrite_project:  # check to see if we're creating opf denovo
-        tmpfd, tmpname = tempfile.mkstemp(dir=os.path.dirname(filename))
-        os.close(tmpfd)
-
-        print("tmpfd {} and tmpname {} and filename {}".format(tmpfd, tmpname, filename))
+    # Same text as json.dump(sheet._to_json(columns), indent=4), or with
+    # separators=(",", ":") if compact
+    if compact:
+        opening, sep, closing, empty = '{"passes":[', ",", "]}", '{"passes":[]}'
+    else:
+        opening, sep, closing, empty = '{\n    "passes": [\n', ",\n", "\n    ]\n}", '{\n    "passes": []\n}'
 
-        with zipfile.ZipFile(filename, "r") as zfin:
-            with zipfile.ZipFile(tmpname, "w") as zfout:
-                zfout.comment = zfin.comment
-                for item in zfin.infolist():
-                    if item.filename != "db":
-                        zfout.writestr(item, zfin.read(item.filename))
+    with open(filename, "w") as outfile:
+        if len(columns) == 0:
+            outfile.write(empty)
+        for i, col in enumerate(columns):
+            outfile.write(sep if i else opening)
+            for text in sheet.columns[col]._fragment("json", compact, millis):
+                outfile.write(text)
+        if len(columns):
+            outfile.write(closing)
+    _mark_saved(sheet, columns)
+
+
+@_timed("save")
+def save_opf(sheet, filename, overwrite_project=False, *columns):
+    """
+    Save sheet to file.
+
+    The archive is written once to a temporary file next to filename and
+    then moved over it. When filename already exists (and overwrite_project
+    is False) its other members are carried over with their compressed
+    bytes copied as-is.
+
+    The db lines are streamed into the archive a few at a time. Columns
+    whose lines fit in FRAGMENT_CACHE_SIZE chars (see pyvyu.column.Column)
+    keep them until next modified, so saving again after an edit only
+    re-renders the edited columns and the larger ones, and memory stays
+    bounded by that size per column.
+    """
 
-        os.remove(filename)
-        os.rename(tmpname, filename)
+    if len(columns) == 0:
+        columns = sheet.columns.keys()
 
-        with zipfile.ZipFile(filename, mode="a") as zf:
-            zf.writestr("db", "#4\n" + sheet._to_opfdb(columns=columns))
-    else:
-        with zipfile.ZipFile(filename, mode="w") as zf:
-            print(zf.infolist())
-            zf.writestr("db", "#4\n" + sheet._to_opfdb(columns=columns))
-            zf.writestr("project", 
+    tmpfd, tmpname = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)))
+    os.close(tmpfd)
+    try:
+        with zipfile.ZipFile(tmpname, mode="w") as zf:
+            if os.path.exists(filename) and not overwrite_project:
+                with zipfile.ZipFile(filename, "r") as zfin:
+                    zf.comment = zfin.comment
+                    for item in zfin.infolist():
+                        if item.filename != "db":
+                            _copy_member(zfin, zf, item)
+                _write_db(zf, sheet, columns)
+            else:
+                _write_db(zf, sheet, columns)
+                zf.writestr(
+                    "project",
                     """!project
 dbFile: {}
 name: {}
 version: 5
 viewerSettings: []
-""".format(filename, filename.replace(".opf", "")))
+""".format(filename, filename.replace(".opf", "")),
+                )
+        os.chmod(tmpname, _file_mode(filename))
+        os.replace(tmpname, filename)
+    except BaseException:
+        os.remove(tmpname)
+        raise
+    _mark_saved(sheet, columns)
+
+
+def _file_mode(filename):
+    """
+    Permissions for a saved file: those of the file it replaces, else what
+    the umask gives a newly created file (mkstemp always uses 0600).
+    """
+
+    if os.path.exists(filename):
+        return stat.S_IMODE(os.stat(filename).st_mode)
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+# _copy_raw writes through private zipfile internals (fp, start_dir,
+# NameToInfo, _FH_* offsets, ZipInfo.FileHeader) checked on these releases
+_RAW_COPY = sys.implementation.name == "cpython" and (3, 7) <= sys.version_info[:2] <= (3, 13)
 
 
+def _mark_saved(sheet, columns):
+    for col in columns:
+        sheet.columns[col]._mark_saved()
+    return sheet
+
+
+def _write_db(zf, sheet, columns):
+    """Stream the db member of sheet into zf, splicing in the columns' kept text."""
+
+    columns = [sheet.columns[col] for col in columns]
+
+    # The size is only known once written; zip64 headers are needed if the
+    # text could encode to more than 2 GiB (at most 4 UTF-8 bytes per char)
+    large = 4 * sum(col._opfdb_size() + 1 for col in columns) > zipfile.ZIP64_LIMIT
+    with zf.open("db", mode="w", force_zip64=large) as raw:
+        with io.TextIOWrapper(io.BufferedWriter(raw, 1 << 16), encoding="utf8", newline="") as db:
+            db.write("#4")
+            for col in columns:
+                db.write("\n")
+                for text in col._fragment("opf"):
+                    db.write(text)
+
+
+def _copy_member(zfin, zfout, item):
+    """
+    Copy a member between archives. On the CPython releases whose zipfile
+    internals _copy_raw relies on, its compressed bytes are copied as-is;
+    elsewhere, and for encrypted members, it is streamed through the
+    public zipfile API and recompressed with its original method.
+    """
+
+    if _RAW_COPY and not item.flag_bits & 0x1:
+        _copy_raw(zfin, zfout, item)
+        return
+
+    with zfin.open(item) as src, zfout.open(copy.copy(item), mode="w") as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+
+
+def _copy_raw(zfin, zfout, item):
+    """Append item's compressed bytes to zfout behind a new local header."""
+
+    zfin.fp.seek(item.header_offset)
+    header = struct.unpack(zipfile.structFileHeader, zfin.fp.read(zipfile.sizeFileHeader))
+    zfin.fp.seek(
+        item.header_offset
+        + zipfile.sizeFileHeader
+        + header[zipfile._FH_FILENAME_LENGTH]
+        + header[zipfile._FH_EXTRA_FIELD_LENGTH]
+    )
+
+    info = copy.copy(item)
+    info.flag_bits &= ~0x08  # sizes go in the local header, no data descriptor
+    zfout.fp.seek(zfout.start_dir)
+    info.header_offset = zfout.fp.tell()
+    zfout.fp.write(info.FileHeader())
+
+    remaining = item.compress_size
+    while remaining > 0:
+        chunk = zfin.fp.read(min(remaining, 1 << 20))
+        zfout.fp.write(chunk)
+        remaining -= len(chunk)
+
+    zfout.start_dir = zfout.fp.tell()
+    zfout.filelist.append(info)
+    zfout.NameToInfo[info.filename] = info
@@ -1,6 +1,16 @@
-from ..column.Column import Column
+from ..column.Column import Column, _encode
+from ..column.ArrayColumn import ArrayColumn
+from ..column.ContentHash import cell_hashes
+from ..export.Parquet import write_cells, write_merged, ROW_GROUP_SIZE
+from collections import namedtuple
+import hashlib
+import numpy as np
 import pandas as pd
-import logging as log
+from ..profiling.Stats import timed, count
+
+# Cells of one column that differ between two sheets, see Spreadsheet.diff
+ColumnDiff = namedtuple("ColumnDiff", ["added", "removed", "changed"])
+
 
 class Spreadsheet:
     """Collection of columns."""
@@ -8,11 +18,17 @@ class Spreadsheet:
     name = ""
     columns = {}
 
-    def __init__(self):
-        pass
+    # Column storage engines selectable with the backend argument
+    backends = {"cells": Column, "arrays": ArrayColumn}
+
+    def __init__(self, backend="cells"):
+        if backend not in self.backends:
+            raise AttributeError(f"Unknown column backend: {backend}")
+        self.backend = backend
+        self.columns = {}
 
     def new_column(self, name, *codes):
-        ncol = Column(name, *codes)
+        ncol = self.backends[self.backend](name, *codes)
         self.columns[name] = ncol
         return ncol
 
@@ -46,14 +62,35 @@ class Spreadsheet:
         self.columns = {colname: col.trim(onset, offset, shift) for (colname, col) in self.columns.items()}
         return self
 
-    def merge_columns(self, name, *columns, prune=True):
+    def window(self, onset, offset, shift=True):
+        """
+        Read-only view of this spreadsheet trimmed to [onset, offset].
+
+        Unlike trim, nothing is modified or copied: each column's cells are
+        found through its interval index and clipped lazily. Call
+        materialize() on the view for an independent spreadsheet.
+        """
+
+        from .SpreadsheetWindow import SpreadsheetWindow
+
+        return SpreadsheetWindow(self, onset, offset, shift)
+
+    @timed("merge")
+    def merge_columns(self, name, *columns, prune=True, output="column"):
         """
         Merge cells of the given columns into a new column.
 
         If prune is True, removes cells spanning intervals
         with no values for any codes.
+
+        output selects the result: "column" (a Column of merged cells),
+        "rows" (lists of ordinal, onset, offset and code values) or
+        "arrays" (a dict of NumPy arrays keyed by those variable names).
         """
 
+        if output not in ("column", "rows", "arrays"):
+            raise AttributeError(f"Unknown merge output: {output}")
+
         if len(columns) == 0:
             columns = self.columns.values()
 
@@ -65,80 +102,357 @@ class Spreadsheet:
             for col in cols
             for codename in (["ordinal"] + col.codelist)
         ]
-        ncol = Column(name, *codes)
 
-        # Get a list of unique timestamps across all cells
-        all_cells = [cell for col in cols for cell in col.cells]
-        unique_times = list(
-            dict.fromkeys(
-                [time for cell in all_cells for time in [cell.onset, cell.offset]]
-            )
-        )
+        # Each cell usually spans several intervals, so build its values once
+        blanks = [[""] * (len(col.codelist) + 1) for col in cols]
+        fragments = {}
 
-        # Get times of point cells (onset == offset)
-        point_times = list(
-            dict.fromkeys(
-                [
-                    cell.onset
-                    for cell in filter(lambda x: x.onset == x.offset, all_cells)
-                ]
-            )
-        )
+        if output == "arrays":
+            return {
+                var: np.asarray(vals, dtype=object if var in codes else np.int64)
+                for var, vals in self._merge_arrays(cols, prune).items()
+            }
 
-        times = sorted(
-            set(unique_times + [x + 1 for x in point_times])
-        )  # this should put a time 1 ms after each of the point times
-        log.debug(times)
-
-        # Iterate over each interval and generate row of values for that interval
+        rows = []
         ordinal = 1
-        prev_time = times[0]
-        for time in times[1:]:
-            onset = prev_time
-            offset = time
-            ncell = ncol.new_cell(ordinal=ordinal, onset=onset, offset=offset)
-            valid_cells = 0  # num cols with data in interval
-            for col in cols:
-                cell = col.cell_at(onset)
-                if cell is not None:
-                    # Don't print point cells unless point region
-                    if onset != offset and cell.onset == cell.offset:
-                        continue
-                    for code in ["ordinal"] + col.codelist:
-                        ncell.change_code(f"{col.name}_{code}", cell.get_code(code))
-                    valid_cells += 1
+        for onset, offset, cells in self._merge_intervals(cols):
+            values = []
+            for blank, cell in zip(blanks, cells):
+                if cell is None:
+                    values.extend(blank)
+                    continue
+                fragment = fragments.get(id(cell))
+                if fragment is None:
+                    fragment = [cell.ordinal] + cell.get_values()
+                    fragments[id(cell)] = fragment
+                values.extend(fragment)
+
+            # Skip this interval if empty and we are pruning
+            if prune and all(v == "" or v is None for v in values):
+                continue
+
+            rows.append([ordinal, onset, offset] + values)
             ordinal += 1
-            prev_time = offset + 1
 
-            # Remove this cell if empty and we are pruning
-            if prune and ncell.isempty():
-                ncol.cells.remove(ncell)
-                ordinal -= 1
+        if output == "rows":
+            return rows
 
+        # Added in one pass; the index and hash are built on first use
+        ncol = Column(name, *codes)
+        ncol._fill(
+            [row[0] for row in rows],
+            [row[1] for row in rows],
+            [row[2] for row in rows],
+            [row[3:] for row in rows],
+        )
         return ncol
 
+    def _merge_intervals(self, cols):
+        """
+        Sweep the boundary times of the given columns once, yielding
+        (onset, offset, cells) for every interval between consecutive
+        boundaries with the cell of each column active at its onset.
+        """
+
+        # Unique onset/offset times, plus a time 1 ms after each point cell
+        boundaries = set()
+        for col in cols:
+            onsets, offsets = col.index.arrays()
+            boundaries.update(onsets.tolist())
+            boundaries.update(offsets.tolist())
+            boundaries.update((onsets[onsets == offsets] + 1).tolist())
+        times = sorted(boundaries)
+        if len(times) < 2:
+            return
+
+        # Intervals are [times[0], times[1]], [times[1] + 1, times[2]], ...
+        onsets = [times[0]] + [t + 1 for t in times[1:-1]]
+        count("intervals", len(onsets))
+        active = [col.index.at_sorted(onsets) for col in cols]
+
+        for i, (onset, offset) in enumerate(zip(onsets, times[1:])):
+            cells = []
+            for col_cells in active:
+                cell = col_cells[i]
+                # Don't print point cells unless point region
+                if cell is not None and onset != offset and cell.onset == cell.offset:
+                    cell = None
+                cells.append(cell)
+            yield onset, offset, cells
+
+    @timed("merge")
+    def _merge_arrays(self, cols, prune=True, times=None):
+        """
+        Vectorized equivalent of merge_columns returning a dict of arrays:
+        int64 ordinal/onset/offset and a Categorical per merged code.
+        times overrides the sorted interval boundaries.
+        """
+
+        intervals = [col.index.arrays() for col in cols]
+        if times is None:
+            times = _boundaries(intervals)
+
+        # Intervals are [times[0], times[1]], [times[1] + 1, times[2]], ...
+        starts = np.concatenate((times[:1], times[1:-1] + 1))
+        ends = times[1:]
+        count("intervals", len(ends))
+        keep = np.full(len(ends), not prune)
+
+        lookups = []
+        for col, (onsets, offsets) in zip(cols, intervals):
+            pos = col.index.positions_at(starts)
+            valid = pos >= 0
+            pos = np.maximum(pos, 0)
+            if len(onsets) > 0:
+                # Don't print point cells unless point region
+                valid &= ~((onsets[pos] == offsets[pos]) & (starts != ends))
+
+            values = [_encode(column) for column in col._index_values()]
+            nonempty = np.zeros(len(onsets), dtype=bool)
+            for codes, categories in values:
+                filled = [c != "" for c in categories] + [False]
+                nonempty |= np.array(filled, dtype=bool)[codes]
+            if len(onsets) > 0:
+                keep |= valid & nonempty[pos]
+            lookups.append((valid, pos, values))
+
+        frame = {
+            "ordinal": np.arange(1, np.count_nonzero(keep) + 1, dtype=np.int64),
+            "onset": starts[keep],
+            "offset": ends[keep],
+        }
+        for col, (valid, pos, values) in zip(cols, lookups):
+            valid = valid[keep]
+            pos = pos[keep][valid]
+
+            codes, categories = values[0]
+            ordinals = np.full(len(valid), "", dtype=object)
+            ordinals[valid] = np.asarray(categories, dtype=object)[codes[pos]]
+            frame[f"{col.name}_ordinal"] = ordinals
+            for code, encoded in zip(col.codelist, values[1:]):
+                frame[f"{col.name}_{code}"] = _gather_categorical(encoded, valid, pos)
+        return frame
+
+    def _merge_epochs(self, cols, onsets, offsets, shift=True):
+        """
+        Batched equivalent of to_df() on windows [onsets[i], offsets[i]] of
+        the given columns, stacked into one frame indexed by (epoch, ordinal).
+
+        The clipped cells of every epoch are laid out one after another on a
+        single time line, spaced so no interval reaches across two epochs,
+        and merged in one pass. Each epoch's first boundary is moved back by
+        1 so its first interval starts at that boundary, as it does when the
+        epoch is merged on its own.
+        """
+
+        onsets = np.asarray(onsets, dtype=np.int64)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        span = int((offsets - onsets).max()) + 3 if len(onsets) else 3
+        origins = np.arange(len(onsets), dtype=np.int64) * span + 2
+        if not shift:
+            origins -= onsets
+
+        spaced = []
+        for col in cols:
+            index = col.index
+            epochs, pos = index.positions_in_ranges(onsets, offsets)
+            # Rows in insertion order within each epoch, so overlaps resolve alike
+            order = np.lexsort((index.seqs(pos), epochs))
+            epochs, pos = epochs[order], pos[order]
+
+            cell_onsets, cell_offsets = index.arrays()
+            starts = np.maximum(cell_onsets[pos], onsets[epochs])
+            stops = np.minimum(cell_offsets[pos], offsets[epochs])
+            if shift:
+                starts = np.maximum(starts - onsets[epochs], 0)
+                stops = np.maximum(stops - onsets[epochs], 0)
+
+            values = col._index_values(pos)
+            codes = {code: _encode(column) for code, column in zip(col.codelist, values[1:])}
+
+            scol = ArrayColumn(col.name, *col.codelist)
+            scol._adopt(
+                np.asarray(values[0], dtype=np.int64),
+                starts + origins[epochs],
+                stops + origins[epochs],
+                codes,
+            )
+            spaced.append(scol)
+
+        times = _boundaries([scol.index.arrays() for scol in spaced])
+        if len(times) > 0:
+            epochs = (times - 2) // span
+            times[np.r_[True, epochs[1:] != epochs[:-1]]] -= 1
+            times = np.concatenate(([0], times))
+        frame = self._merge_arrays(spaced, True, times)
+
+        epochs = (frame["onset"] - 2) // span
+        frame["onset"] = frame["onset"] - origins[epochs]
+        frame["offset"] = frame["offset"] - origins[epochs]
+        firsts = np.searchsorted(epochs, epochs)
+        ordinals = np.arange(1, len(epochs) + 1) - firsts
+        del frame["ordinal"]
+
+        index = pd.MultiIndex.from_arrays([epochs, ordinals], names=["epoch", "ordinal"])
+        return pd.DataFrame(frame, index=index)
+
+    def overlap_join(self, left_col, right_col, how="inner", min_overlap=0):
+        """
+        Pair each cell of left_col with every cell of right_col overlapping
+        it by at least min_overlap ms.
+
+        Returns a DataFrame with the ordinal, onset, offset and codes of
+        both cells, prefixed with their column names, and the overlap
+        duration in ms. Rows are ordered by left cell onset, then right cell
+        onset. how="left" also keeps left cells without a match, with the
+        right side missing.
+        """
+
+        if how not in ("inner", "left"):
+            raise AttributeError(f"Unknown join: {how}")
+
+        left, right = self.map_columns(left_col, right_col)
+        onsets, offsets = left.index.arrays()
+        right_onsets, right_offsets = right.index.arrays()
+
+        lpos, rpos = right.index.positions_in_ranges(onsets, offsets)
+        overlap = np.minimum(offsets[lpos], right_offsets[rpos]) - np.maximum(
+            onsets[lpos], right_onsets[rpos]
+        )
+        keep = overlap >= min_overlap
+        lpos, rpos, overlap = lpos[keep], rpos[keep], overlap[keep]
+
+        if how == "left":
+            unmatched = np.ones(len(onsets), dtype=bool)
+            unmatched[lpos] = False
+            unmatched = np.flatnonzero(unmatched)
+            order = np.argsort(np.concatenate((lpos, unmatched)), kind="stable")
+            lpos = np.concatenate((lpos, unmatched))[order]
+            rpos = np.concatenate((rpos, np.full(len(unmatched), -1)))[order]
+            overlap = np.concatenate((overlap, np.full(len(unmatched), np.nan)))[order]
+
+        prefixes = [left.name, right.name]
+        if left.name == right.name:
+            prefixes = [f"{left.name}_left", f"{left.name}_right"]
+
+        frame = {}
+        for col, pos, prefix in zip((left, right), (lpos, rpos), prefixes):
+            found = pos >= 0
+            values = col._index_values()
+            intrinsics = [np.asarray(values[0], dtype=np.int64)] + list(col.index.arrays())
+            for var, arr in zip(("ordinal", "onset", "offset"), intrinsics):
+                frame[f"{prefix}_{var}"] = _take(arr, pos, found)
+            for code, column in zip(col.codelist, values[1:]):
+                keys, categories = _encode(column)
+                frame[f"{prefix}_{code}"] = pd.Categorical.from_codes(
+                    _take(keys, pos, found, -1), categories=categories
+                )
+        frame["overlap"] = overlap
+        return pd.DataFrame(frame)
+
+    @classmethod
+    def from_df(cls, df, backend="cells"):
+        """
+        Build a spreadsheet from a to_df() frame.
+
+        Each column's rows are grouped into cells by its ordinal, spanning
+        from the earliest row onset to the latest row offset. Merging gives
+        each interval to the cells spanning its start, so a cell whose onset
+        is not 1 ms after another boundary comes back starting 1 ms late,
+        and pruned all-blank intervals are lost.
+        """
+
+        sheet = cls(backend)
+        groups = []
+        for var in df.columns:
+            if var.endswith("_ordinal"):
+                groups.append((var[: -len("_ordinal")], []))
+            elif var not in ("onset", "offset") and groups:
+                groups[-1][1].append(var)
+
+        for name, variables in groups:
+            ordinals = np.asarray(df[f"{name}_ordinal"].values, dtype=object)
+            present = pd.notna(ordinals) & (ordinals != "")
+            cells = pd.DataFrame(
+                {
+                    "ordinal": ordinals[present].astype(np.int64),
+                    "onset": df["onset"].values[present],
+                    "offset": df["offset"].values[present],
+                }
+            )
+            for var in variables:
+                cells[var[len(name) + 1 :]] = df[var].values[present]
+
+            aggregate = {var: "first" for var in cells.columns[3:]}
+            aggregate.update(onset="min", offset="max")
+            cells = cells.groupby("ordinal", sort=False).agg(aggregate)
+            col = cls.backends[backend].from_dataframe(cells, name)
+            sheet.columns[name] = col
+        return sheet
+
+    @timed("to_df")
     def to_df(self, *columns):
         """Convert column set from this spreadsheet to a Pandas dataframe"""
 
         if len(columns) == 0:
             columns = self.columns.values()
 
-        merge_col = self.merge_columns("temp", *columns)
-        log.debug(merge_col)
+        cols = self.map_columns(*columns)
 
-        variable_list = ["ordinal", "onset", "offset"] + merge_col.codelist
-        data = [cell.get_values(intrinsics=True) for cell in merge_col.sorted_cells()]
-        df = pd.DataFrame(data, columns=variable_list)
+        df = pd.DataFrame(self._merge_arrays(cols))
         df.set_index("ordinal", inplace=True)
         return df
 
+    def to_parquet(self, path, *columns, merged=False, file=None, row_group_size=ROW_GROUP_SIZE):
+        """
+        Write column set from this spreadsheet to a Parquet file, one row per
+        cell with dictionary-encoded codes, in row groups of at most
+        row_group_size cells. merged=True writes the table of to_df instead.
+        file adds a field holding that value. Needs pyarrow.
+        """
+
+        if merged:
+            write_merged(self, path, columns or None, file, row_group_size)
+        else:
+            write_cells(self, path, columns or None, file, row_group_size)
+
+    def to_timeseries(self, bin_ms, *columns, start=0, stop=None, occupancy=False, rle=False):
+        """
+        Rasterize columns into common time bins, as Column.to_timeseries;
+        stop defaults to just past the last offset of any of them. Returns
+        a dict of the columns' results keyed by column name.
+        """
+
+        if len(columns) == 0:
+            columns = self.columns.values()
+
+        cols = self.map_columns(*columns)
+
+        if stop is None:
+            ends = [col.index.arrays()[1] for col in cols]
+            stop = max([int(e.max()) + 1 for e in ends if len(e)], default=start)
+
+        return {
+            col.name: col.to_timeseries(bin_ms, start, stop, occupancy, rle) for col in cols
+        }
+
     def values_at(self, time, *columns):
         """Find values of codes in columns at a time point."""
 
         if len(columns) == 0:
             columns = self.columns.values()
 
-        return [val for cell in self.cells_at(time, *columns) for val in cell.values()]
+        return [
+            val
+            for cell in self.cells_at(time, *columns)
+            if cell is not None
+            for val in cell.get_values()
+        ]
+
+    def query(self, column, where=None, during=None):
+        """Cells of a column matching codes and time span, as Column.query."""
+
+        return self.map_columns(column)[0].query(where, during)
 
     def cells_at(self, time, *columns):
         """Find the cells spanning a time point."""
@@ -150,12 +464,55 @@ class Spreadsheet:
 
         return [col.cell_at(time) for col in cols]
 
-    def _to_opfdb(self, columns=columns.keys()):
+    def _to_opfdb(self, columns=None):
         """Converts to .opf compatible string."""
-        return "\n".join([self.columns[col]._to_opfdb() for col in columns])
+        if columns is None:
+            columns = self.columns.keys()
+        return "\n".join(self._iter_opfdb(columns))
+
+    def _iter_opfdb(self, columns=None):
+        """Yield the .opf db lines of the given columns, one at a time."""
+        if columns is None:
+            columns = self.columns.keys()
+        for col in columns:
+            yield from self.columns[col]._iter_opfdb()
+
+    def _to_json(self, columns=None, millis=False):
+        if columns is None:
+            columns = self.columns.keys()
+        return {"passes": [self.columns[col]._to_json(millis) for col in columns]}
+
+    def content_hash(self):
+        """128-bit hash of the names and content hashes of this sheet's columns."""
+
+        digest = hashlib.blake2b(digest_size=16)
+        for name in sorted(self.columns):
+            digest.update(f"{name}:{self.columns[name].content_hash():032x};".encode("utf8"))
+        return int.from_bytes(digest.digest(), "big")
+
+    def diff(self, other):
+        """
+        Cells that differ from this sheet to other, as {column name:
+        ColumnDiff(added, removed, changed)} for each column that differs.
+
+        Cells are matched on onset and offset. added holds cells of other
+        with no match here and removed cells of this sheet with no match in
+        other, while changed pairs up (old, new) cells with equal times but
+        different codes. Columns with equal content hashes are skipped
+        without looking at their cells; the rest are compared in linear time
+        through per-cell hashes.
+        """
 
-    def _to_json(self, columns=columns.keys()):
-        return {"passes": [self.columns[col]._to_json() for col in columns]}
+        names = list(self.columns) + [n for n in other.columns if n not in self.columns]
+        result = {}
+        for name in names:
+            old, new = self.columns.get(name), other.columns.get(name)
+            if old is not None and new is not None and old.content_hash() == new.content_hash():
+                continue
+            changes = _diff_cells(old, new)
+            if any(changes):
+                result[name] = changes
+        return result
 
     def __eq__(self, other):
         if isinstance(self, other.__class__):
@@ -163,9 +520,98 @@ class Spreadsheet:
                 return False
 
             for colname, col in self.columns.items():
-                if other.columns[colname] != col:
+                if colname not in other.columns or other.columns[colname] != col:
                     return False
             return True
 
         return False
 
+
+
+def _cell_keys(col):
+    """Cells of col and their (onset, offset, hash lanes) keys, in cell order."""
+
+    if col is None:
+        return [], []
+    _, onsets, offsets, codes = col._columnar()
+    hashes = cell_hashes(onsets, offsets, codes)
+    keys = zip(onsets.tolist(), offsets.tolist(), hashes[:, 0].tolist(), hashes[:, 1].tolist())
+    return col.cells, list(keys)
+
+
+def _diff_cells(old, new):
+    old_cells, old_keys = _cell_keys(old)
+    new_cells, new_keys = _cell_keys(new)
+
+    # Pair up identical cells; lists are reversed so pop() takes the earliest
+    unmatched = {}
+    for i in reversed(range(len(old_keys))):
+        unmatched.setdefault(old_keys[i], []).append(i)
+    added = []
+    for j, key in enumerate(new_keys):
+        same = unmatched.get(key)
+        if same:
+            same.pop()
+        else:
+            added.append(j)
+    removed = sorted(i for positions in unmatched.values() for i in positions)
+
+    # What is left with the same times was edited
+    by_time = {}
+    for i in reversed(removed):
+        by_time.setdefault(old_keys[i][:2], []).append(i)
+    changed, inserted = [], []
+    for j in added:
+        same = by_time.get(new_keys[j][:2])
+        if same:
+            changed.append((same.pop(), j))
+        else:
+            inserted.append(j)
+    deleted = sorted(i for positions in by_time.values() for i in positions)
+
+    def ordered(positions, keys):
+        return sorted(positions, key=lambda p: keys[p][:2])
+
+    return ColumnDiff(
+        [new_cells[j] for j in ordered(inserted, new_keys)],
+        [old_cells[i] for i in ordered(deleted, old_keys)],
+        [(old_cells[i], new_cells[j]) for i, j in sorted(changed, key=lambda p: old_keys[p[0]][:2])],
+    )
+
+
+def _boundaries(intervals):
+    """
+    Sorted unique onset and offset times of the given (onsets, offsets)
+    pairs, plus a time 1 ms after each point cell.
+    """
+
+    bounds = [np.empty(0, dtype=np.int64)]
+    for onsets, offsets in intervals:
+        onsets = np.asarray(onsets, dtype=np.int64)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        bounds.extend([onsets, offsets, onsets[onsets == offsets] + 1])
+    return np.unique(np.concatenate(bounds))
+
+
+def _take(values, pos, found, missing=np.nan):
+    """values[pos] where found, missing elsewhere (making ints float for NaN)."""
+
+    if found.all():
+        return values[pos]
+    out = np.full(len(pos), missing, dtype=np.result_type(values, missing))
+    out[found] = values[pos[found]]
+    return out
+
+
+def _gather_categorical(encoded, valid, pos):
+    """
+    Pick the encoded value at pos[i] for each valid row, filling the
+    remaining rows with "".
+    """
+
+    codes, categories = encoded
+    if "" not in categories:
+        categories = categories + [""]
+    out = np.full(len(valid), categories.index(""), dtype=codes.dtype)
+    out[valid] = codes[pos]
+    return pd.Categorical.from_codes(out, categories=categories)
@@ -0,0 +1,51 @@
+from ..column.ColumnWindow import ColumnWindow
+from .Spreadsheet import Spreadsheet
+
+
+class SpreadsheetWindow(Spreadsheet):
+    """
+    Read-only view of a spreadsheet trimmed to [onset, offset], made of one
+    ColumnWindow per column. Queries, to_df and merge_columns work as on a
+    trimmed copy; filter_columns and remove_empty_columns only narrow the
+    view.
+    """
+
+    def __init__(self, sheet, onset, offset, shift=True, columns=None, positions=None):
+        """
+        columns limits the view to the named columns. positions may map
+        column names to the index positions of their overlapping cells, if
+        already known.
+        """
+
+        if onset > offset:
+            raise AttributeError('the Onset cannot be greater than the Offset')
+
+        self.sheet = sheet
+        self.name = sheet.name
+        self.backend = sheet.backend
+        self.onset = onset
+        self.offset = offset
+        self.shift = shift
+        if columns is None:
+            columns = sheet.columns.keys()
+        positions = positions or {}
+        self.columns = {
+            colname: ColumnWindow(
+                sheet.columns[colname], onset, offset, shift, positions.get(colname)
+            )
+            for colname in columns
+        }
+
+    def new_column(self, name, *codes):
+        raise AttributeError("Spreadsheet windows are read-only, materialize() them first")
+
+    def trim(self, onset, offset, shift=True):
+        raise AttributeError("Spreadsheet windows are read-only, use window() or materialize()")
+
+    def materialize(self):
+        """Copy the window into a new, independent Spreadsheet."""
+
+        sheet = Spreadsheet(self.backend)
+        sheet.name = self.name
+        sheet.columns = {colname: col.materialize() for (colname, col) in self.columns.items()}
+        return sheet
@@ -1,9 +1,19 @@
 import pyvyu as pv
+import numpy as np
 import pandas as pd
 import logging as log
 import os
+import json
+import itertools
+import pickle
+import zipfile
 import pkg_resources
 import pytest
+from pyvyu.cell.Cell import Cell
+import pyvyu.column.Column as column_module
+from pyvyu.column.Column import Column
+from pyvyu.column.ArrayColumn import ArrayColumn
+from benchmarks.synthetic import generate, write
 
 
 def get_resource(file):
@@ -58,6 +68,199 @@ def test_trim_sheet(sample_spreadsheet, trimmed_sample_spreadsheet, onset, offse
     sheet_trimmed = pv.load_opf(trimmed_sample_spreadsheet)
     assert sheet == sheet_trimmed
 
+@pytest.mark.parametrize("backend", ["cells", "arrays"])
+def test_window(backend, sample_spreadsheet, trimmed_sample_spreadsheet, onset, offset):
+    sheet = pv.load_opf(sample_spreadsheet, backend=backend)
+    window = sheet.window(onset, offset)
+    sheet_trimmed = pv.load_opf(trimmed_sample_spreadsheet)
+
+    materialized = window.materialize()
+    assert materialized == sheet_trimmed
+    assert window.to_df().astype(object).equals(materialized.to_df().astype(object))
+    assert window.values_at(1000) == sheet_trimmed.values_at(1000)
+    assert len(sheet.get_column("MomSpeech").cells) == 20  # source untouched
+
+    # Edits of the column after the first query don't show through
+    expected = [c.get_values(True) for c in window.get_column("MomSpeech").cells]
+    speech = sheet.window(onset, offset).get_column("MomSpeech")
+    assert len(speech.index) == len(expected)
+    source = sheet.get_column("MomSpeech")
+    source.remove_cell(source.cells[0])
+    source.new_cell("late", onset=onset, offset=offset)
+    source.cells[-2].change_code("transcript", "edited")
+    assert [c.get_values(True) for c in speech.cells] == expected
+    assert speech.query({"transcript": "late"}) == []
+
+    with pytest.raises(AttributeError):
+        window.get_column("MomSpeech").new_cell()
+    with pytest.raises(AttributeError):
+        window.trim(0, 1)
+
+
+def test_extract_epochs(sample_spreadsheet):
+    sheet = pv.load_opf(sample_spreadsheet)
+    trials = sheet.get_column("MomObject").sorted_cells()
+    epochs = pv.extract_epochs(sheet, "MomObject", columns=["MomSpeech", "BabyObject"])
+    assert len(epochs) == len(trials)
+
+    stacked = pv.extract_epochs(sheet, [(c.onset, c.offset) for c in trials], as_df=True)
+    for i, trial in enumerate(trials):
+        trimmed = pv.load_opf(get_resource("DatavyuSampleSpreadsheet.opf"))
+        trimmed.filter_columns("MomSpeech", "BabyObject")
+        trimmed.trim(trial.onset, trial.offset)
+        assert epochs[i].materialize() == trimmed
+
+        window = sheet.window(trial.onset, trial.offset).to_df()
+        assert stacked.loc[i].astype(object).equals(window.astype(object))
+
+
+@pytest.mark.parametrize("backend", ["cells", "arrays"])
+def test_to_timeseries(backend, sample_spreadsheet):
+    sheet = pv.load_opf(sample_spreadsheet, backend=backend)
+    bin_ms = 1000 / 30
+    series = sheet.to_timeseries(bin_ms, stop=60_000)
+    occupancy = sheet.to_timeseries(bin_ms, stop=60_000, occupancy=True)
+    runs = sheet.to_timeseries(bin_ms, stop=60_000, rle=True)
+
+    for name, col in sheet.columns.items():
+        assert len(occupancy[name]) == 1800
+        for frame in range(0, 1800, 7):
+            time = int(frame * bin_ms)
+            assert occupancy[name][frame] == (col.cell_at(time) is not None)
+            values = [
+                cats[keys[frame]] if keys[frame] >= 0 else None
+                for keys, cats in series[name].values()
+            ]
+            assert values == (col.values_at(time) or [None] * len(col.codelist))
+
+        for code, (keys, cats) in series[name].items():
+            firsts, lengths, run_keys = runs[name][code][0]
+            run_cats = runs[name][code][1]
+            dense = [cats[k] if k >= 0 else None for k in keys]
+            assert dense == [run_cats[k] if k >= 0 else None for k in np.repeat(run_keys, lengths)]
+
+
+def test_overlap_join(sample_spreadsheet):
+    sheet = pv.load_opf(sample_spreadsheet)
+    mom = sheet.get_column("MomSpeech")
+    joined = sheet.overlap_join("MomSpeech", "InfantSpeech")
+
+    pairs = [
+        (m.ordinal, i.ordinal, min(m.offset, i.offset) - max(m.onset, i.onset))
+        for m in mom.index.cells
+        for i in sheet.get_column("InfantSpeech").index.cells
+        if m.in_range(i.onset, i.offset)
+    ]
+    assert list(zip(joined["MomSpeech_ordinal"], joined["InfantSpeech_ordinal"], joined["overlap"])) == pairs
+
+    left = sheet.overlap_join(mom, "InfantSpeech", how="left", min_overlap=500)
+    assert set(left["MomSpeech_ordinal"]) == {c.ordinal for c in mom.cells}
+    assert (left["overlap"].dropna() >= 500).all()
+    assert left["InfantSpeech_transcript"].isna().sum() == left["overlap"].isna().sum()
+
+
+@pytest.mark.parametrize("backend", ["cells", "arrays"])
+def test_query(backend, sample_spreadsheet):
+    sheet = pv.load_opf(sample_spreadsheet, backend=backend)
+    col = sheet.get_column("MomObject")
+    value = col.cells[0].get_code("object1")
+
+    def scan(during=None):
+        return [
+            c.ordinal
+            for c in col.index.cells
+            if c.get_code("object1") == value and (during is None or c.in_range(*during))
+        ]
+
+    assert [c.ordinal for c in sheet.query("MomObject", {"object1": value})] == scan()
+    assert [c.ordinal for c in sheet.query(col, {"object1": value}, during=(30_000, 60_000))] == scan(
+        (30_000, 60_000)
+    )
+    assert len(sheet.query(col, {"object1": lambda v: True})) == len(col.cells)
+
+    # Edits invalidate the value index
+    col.cells[1].change_code("object1", value)
+    assert [c.ordinal for c in sheet.query(col, {"object1": value})] == scan()
+
+
+@pytest.mark.parametrize("cls", [Column, ArrayColumn])
+def test_column_extend(cls, sample_spreadsheet, tmp_path):
+    source = pv.load_opf(sample_spreadsheet).get_column("MomObject")
+    cells = source.cells
+
+    col = cls("MomObject", *source.codelist)
+    col.extend(
+        [pv.to_timestamp(c.onset) for c in cells],
+        [c.offset for c in cells],
+        {"object1": [c.get_code("object1") for c in cells]},
+        [c.ordinal for c in cells],
+    )
+    assert [c.get_values(True) for c in col.cells] == [
+        [c.ordinal, c.onset, c.offset, c.get_code("object1"), ""] for c in cells
+    ]
+
+    col.extend([1, 2], [3, 4], [["a", "b"], ["c"]])
+    assert col._index is None or len(col._index) == len(col.cells)
+    assert [c.get_values(True) for c in col.cells[-2:]] == [[10, 1, 3, "a", "b"], [11, 2, 4, "c", ""]]
+
+    with pytest.raises(AttributeError):
+        col.extend([1, 2], [3])
+    with pytest.raises(Exception):
+        col.extend([1], [3], {"missing": ["a"]})
+    assert len(col.cells) == len(cells) + 2
+
+    df = pd.DataFrame(
+        {"ordinal": [1, 2], "onset": [0, 10], "offset": [5, 15], "code": ["a", None]}
+    )
+    built = cls.from_dataframe(df, "Built")
+    assert [c.get_values(True) for c in built.cells] == [[1, 0, 5, "a"], [2, 10, 15, ""]]
+
+    sheet = pv.Spreadsheet()
+    sheet.columns["Numbers"] = cls.from_dataframe(
+        pd.DataFrame({"onset": [0, 10, 20], "offset": [5, 15, 25], "x": [1, 2.5, np.nan]}), "Numbers"
+    )
+    assert [c.get_code("x") for c in sheet.get_column("Numbers").cells] == ["1.0", "2.5", ""]
+    filename = str(tmp_path / "numbers.opf")
+    pv.save_opf(sheet, filename)
+    assert pv.load_opf(filename) == sheet
+
+
+def test_from_df(sample_spreadsheet):
+    sheet = pv.load_opf(sample_spreadsheet)
+    rebuilt = pv.Spreadsheet.from_df(sheet.to_df(), backend="arrays")
+
+    assert rebuilt.get_column_list() == sheet.get_column_list()
+    for name, col in sheet.columns.items():
+        cells = {c.ordinal: c for c in col.cells}
+        for cell in rebuilt.get_column(name).cells:
+            original = cells[cell.ordinal]
+            assert cell.get_values() == original.get_values()
+            assert original.onset <= cell.onset <= original.onset + 1
+            assert cell.offset == original.offset
+
+
+def test_load_pushdown(sample_spreadsheet, onset, offset, tmp_path):
+    columns = ["MomSpeech", "MomObject"]
+    sheet = pv.load_opf(sample_spreadsheet)
+    sheet = pv.trim_sheet(onset, offset, sheet, True, False, *columns)
+
+    loaded = pv.load_opf(
+        get_resource("DatavyuSampleSpreadsheet.opf"),
+        columns=columns,
+        window=(onset, offset),
+    )
+    assert loaded.get_column_list() == columns
+    assert loaded == sheet
+
+    filename = str(tmp_path / "sample.json")
+    pv.save_json(pv.load_opf(get_resource("DatavyuSampleSpreadsheet.opf")), filename)
+    loaded = pv.load_json(filename, columns=columns, window=(onset, offset))
+    assert loaded == sheet
+
+    with pytest.raises(AttributeError):
+        pv.load_opf(get_resource("DatavyuSampleSpreadsheet.opf"), window=(offset, onset))
+
+
 def test_spreadsheet_to_df(sample_spreadsheet):
     sheet = pv.load_opf(sample_spreadsheet)
     df = sheet.to_df()
@@ -69,6 +272,17 @@ def test_spreadsheet_to_df(sample_spreadsheet):
     ms = sheet.to_df("MomSpeech")
     log.info(ms)
     assert 20 == len(ms)
+    assert isinstance(ms["MomSpeech_transcript"].dtype, pd.CategoricalDtype)
+
+
+def test_spreadsheet_to_df_matches_merge(sample_spreadsheet):
+    sheet = pv.load_opf(sample_spreadsheet)
+    df = sheet.to_df()
+    merged = sheet.merge_columns("merged")
+
+    assert list(df.columns) == ["onset", "offset"] + merged.codelist
+    for (ordinal, row), cell in zip(df.astype(object).iterrows(), merged.cells):
+        assert [ordinal] + list(row) == cell.get_values(intrinsics=True)
 
 
 def test_json(sample_spreadsheet):
@@ -84,6 +298,530 @@ def test_json(sample_spreadsheet):
     os.remove("test.json")
 
 
+def test_synthetic_sheet(tmp_path):
+    sheet = generate(columns=3, cells=200, codes=2, cardinality=5, point_ratio=0.2, overlap=0.3)
+    assert sheet == generate(columns=3, cells=200, codes=2, cardinality=5, point_ratio=0.2, overlap=0.3)
+    assert sheet.get_column_list() == ["column0", "column1", "column2"]
+
+    col = sheet.get_column("column0")
+    assert len(col.cells) == 200
+    assert {v for c in col.cells for v in c.get_values()} <= {f"v{k}" for k in range(5)}
+    assert any(c.onset == c.offset for c in col.cells)
+    assert col.index.overlapping()
+
+    for ext, load in (("opf", pv.load_opf), ("json", pv.load_json)):
+        path = str(tmp_path / f"synthetic.{ext}")
+        write(sheet, path)
+        assert load(path) == sheet
+
+
+@pytest.mark.parametrize("backend", ["cells", "arrays"])
+def test_content_hash_and_diff(backend, sample_spreadsheet):
+    sheet = pv.load_opf(sample_spreadsheet, backend)
+    sample_spreadsheet.seek(0)
+    edited = pv.load_opf(sample_spreadsheet, backend)
+    assert edited.content_hash() == sheet.content_hash()
+    assert edited == sheet and sheet.diff(edited) == {}
+
+    if backend == "cells":
+        # A cell replaced in place drops the cached hash
+        edited.get_column("MomSpeech").content_hash()
+        edited.get_column("MomSpeech").cells[0] = Cell(edited.get_column("MomSpeech"), 1, 0, 10)
+        assert edited != sheet
+
+        # Unhashable values are hashed uncached
+        listed = Column("Test", "code")
+        listed.new_cell(["a", "b"], onset=0, offset=10)
+        same = Column("Test", "code")
+        same.new_cell(["a", "b"], onset=0, offset=10)
+        assert listed == same
+        same.cells[0].change_code("code", ["a"])
+        assert listed != same
+        sample_spreadsheet.seek(0)
+        edited = pv.load_opf(sample_spreadsheet, backend)
+
+    col = edited.get_column("MomSpeech")
+    before = col.content_hash()
+    first, second, third = col.cells[:3]
+    first.change_code("transcript", "edited")
+    assert col.content_hash() != before
+    first.change_code("transcript", sheet.get_column("MomSpeech").cells[0].get_code("transcript"))
+    assert col.content_hash() == before
+
+    second.change_code("transcript", "edited")
+    col.remove_cell(third)
+    added = col.new_cell("new", onset=1, offset=2)
+    assert edited != sheet
+
+    diff = sheet.diff(edited)
+    assert list(diff) == ["MomSpeech"]
+    assert diff["MomSpeech"].added == [added]
+    assert diff["MomSpeech"].removed == [sheet.get_column("MomSpeech").cells[2]]
+    (old, new), = diff["MomSpeech"].changed
+    assert old.get_code("transcript") != "edited" and new.get_code("transcript") == "edited"
+
+
+@pytest.mark.parametrize("backend", ["cells", "arrays"])
+def test_save_unpickled(backend, sample_spreadsheet, tmp_path, monkeypatch):
+    sheet = pv.load_opf(sample_spreadsheet, backend)
+    col = sheet.get_column("MomSpeech")
+    data = pickle.dumps(sheet)
+
+    # As in a parent process whose counter hands out the worker's versions
+    monkeypatch.setattr(column_module, "_versions", itertools.count(col._version))
+    sheet = pickle.loads(data)
+    col = sheet.get_column("MomSpeech")
+    assert not col.modified
+
+    path = str(tmp_path / "saved.opf")
+    pv.save_opf(sheet, path, True)
+    col.cells[0].change_code("transcript", "edited")
+    assert col.modified
+    pv.save_opf(sheet, path, True)
+    assert pv.load_opf(path, backend).get_column("MomSpeech").cells[0].get_code("transcript") == "edited"
+
+    col.cells[1].change_code("transcript", "unsaved")
+    assert pickle.loads(pickle.dumps(col)).modified
+
+
+@pytest.mark.parametrize("backend", ["cells", "arrays"])
+def test_incremental_save(backend, sample_spreadsheet, tmp_path, monkeypatch):
+    sheet = pv.load_opf(sample_spreadsheet, backend)
+    assert not any(col.modified for col in sheet.columns.values())
+
+    path, json_path = str(tmp_path / "saved.opf"), str(tmp_path / "saved.json")
+    pv.save_opf(sheet, path, True)
+    kept = sheet.get_column("BabyObject")._serialized
+
+    col = sheet.get_column("MomSpeech")
+    col.cell_at(0)
+    assert not col.modified
+    col.cells[0].change_code("transcript", "edited")
+    assert col.modified and not sheet.get_column("BabyObject").modified
+
+    pv.save_opf(sheet, path, True)
+    assert sheet.get_column("BabyObject")._serialized is kept
+    assert not col.modified
+    assert pv.load_opf(path, backend) == sheet
+
+    # Columns over the cache size are streamed and not kept
+    monkeypatch.setattr(column_module, "FRAGMENT_CACHE_SIZE", 100)
+    pv.save_json(sheet, json_path)
+    assert sheet.get_column("BabyObject")._serialized is None
+    with open(json_path) as f:
+        assert f.read() == json.dumps(sheet._to_json(), indent=4)
+    pv.save_opf(sheet, path, True)
+    assert pv.load_opf(path, backend) == sheet
+
+
+@pytest.mark.parametrize("backend", ["cells", "arrays"])
+def test_json_options(backend, sample_spreadsheet, tmp_path):
+    sheet = pv.load_opf(sample_spreadsheet, backend)
+    sheet.get_column("MomSpeech").cells[0].change_code("transcript", 'say "hi"\n')
+    path = str(tmp_path / "compact.json")
+    pv.save_json(sheet, path, compact=True, millis=True)
+    with open(path) as f:
+        assert f.read() == json.dumps(sheet._to_json(millis=True), separators=(",", ":"))
+
+    # Read back with a tiny block size so passes span many reads
+    with open(path) as f:
+        passes = list(pv.pyvyu._iter_passes(f, 7))
+    assert [p["name"] for p in passes] == sheet.get_column_list()
+    assert pv.load_json(path, backend) == sheet
+    assert [r.onset for r in pv.iter_json(path, ["MomSpeech"])] == [
+        c.onset for c in sheet.get_column("MomSpeech").cells
+    ]
+
+    empty = pv.Spreadsheet(backend)
+    empty.new_column("none", "code")
+    pv.save_json(empty, path, compact=True)
+    assert pv.load_json(path, backend).get_column("none").cells == []
+
+
+@pytest.mark.parametrize("backend", ["cells", "arrays"])
+def test_parquet(backend, sample_spreadsheet, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    sheet = pv.load_opf(sample_spreadsheet, backend)
+    path = str(tmp_path / "cells.parquet")
+    sheet.to_parquet(path, "MomSpeech", "MomObject", row_group_size=10)
+
+    table = pq.read_table(path)
+    assert table.schema.names == ["column", "ordinal", "onset", "offset", "transcript", "object1", "object2"]
+    assert pq.ParquetFile(path).metadata.num_row_groups > 2
+    df = table.to_pandas()
+    speech = df[df["column"] == "MomSpeech"]
+    assert speech["onset"].tolist() == [c.onset for c in sheet.get_column("MomSpeech").cells]
+    assert speech["transcript"].tolist() == [c.get_code("transcript") for c in sheet.get_column("MomSpeech").cells]
+    assert speech["object1"].isnull().all()
+
+    sheet.to_parquet(path, merged=True, file="sample")
+    merged = pq.read_table(path).to_pandas()
+    expected = sheet.to_df()
+    assert merged["onset"].tolist() == expected["onset"].tolist()
+    assert merged["MomSpeech_transcript"].astype(str).tolist() == expected["MomSpeech_transcript"].astype(str).tolist()
+    assert set(merged["file"]) == {"sample"}
+
+
+@pytest.mark.parametrize("backend", ["cells", "arrays"])
+def test_export_parquet(backend, sample_spreadsheet, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    sheet = pv.load_opf(sample_spreadsheet, backend)
+    notes = pv.Spreadsheet(backend)
+    notes.new_column("Notes", "note", "rating").new_cell("loud", "3", onset=0, offset=100)
+    notes.new_column("MomSpeech", "transcript").new_cell("hi", onset=50, offset=60)
+    sources = [str(tmp_path / "session.opf"), str(tmp_path / "notes.json")]
+    pv.save_opf(sheet, sources[0], True)
+    pv.save_json(notes, sources[1])
+    out = str(tmp_path / "export")
+    written = pv.export_parquet(sources, out, ["column", lambda p: {"site": "a b"}], merged=True, executor="thread")
+    assert sorted(written) == sorted(sources)
+    assert len(written[sources[0]]) == len(sheet.columns) + 1
+    assert os.path.join(out, "cells", "column=MomSpeech", "site=a%20b", "session.opf.parquet") in written[sources[0]]
+    assert os.path.join(out, "merged", "site=a%20b", "session.opf.parquet") in written[sources[0]]
+
+    # Every file has every code field, so the directories read as one dataset
+    cells = pq.read_table(os.path.join(out, "cells")).to_pandas()
+    codes = list(dict.fromkeys(code for s in (sheet, notes) for col in s.columns.values() for code in col.codelist))
+    assert set(codes) <= set(cells.columns)
+    assert len(cells) == sum(len(col.cells) for s in (sheet, notes) for col in s.columns.values())
+    for source, s in zip(sources, (sheet, notes)):
+        for col in s.columns.values():
+            rows = cells[(cells["file"] == source) & (cells["column"] == col.name)]
+            assert rows["onset"].tolist() == [c.onset for c in col.cells]
+            for code in codes:
+                expected = [c.get_code(code) for c in col.cells] if code in col.codelist else [None] * len(col.cells)
+                assert rows[code].astype(object).where(rows[code].notna(), None).tolist() == expected
+
+    merged = pq.read_table(os.path.join(out, "merged")).to_pandas()
+    assert set(merged["file"]) == set(sources)
+    assert {"Notes_note", "Notes_rating", "BabyObject_object1"} <= set(merged.columns)
+    assert merged[merged["file"] == sources[0]]["Notes_note"].isnull().all()
+    assert set(merged[merged["file"] == sources[1]]["Notes_note"].dropna()) == {"loud"}
+
+
+def test_iter_cells(sample_spreadsheet, tmp_path):
+    sheet = pv.load_opf(sample_spreadsheet)
+    expected = [
+        (name, c.ordinal, c.onset, c.offset, c.get_values())
+        for name in sheet.get_column_list()
+        for c in sheet.get_column(name).cells
+    ]
+    sample_spreadsheet.seek(0)
+    assert [tuple(r) for r in pv.iter_opf(sample_spreadsheet, chunk=7)] == expected
+
+    path = str(tmp_path / "iter.json")
+    pv.save_json(sheet, path)
+    records = list(pv.iter_json(path, columns=["MomSpeech"]))
+    assert len(records) == 20
+    assert records[0] == pv.CellRecord(*expected[0])
+
+
+def test_corpus_index(sample_spreadsheet, tmp_path):
+    sheet = pv.load_opf(sample_spreadsheet)
+    first, second = str(tmp_path / "first.opf"), str(tmp_path / "second.json")
+    pv.save_opf(sheet, first, True)
+    pv.save_json(sheet, second)
+
+    with pv.CorpusIndex(str(tmp_path / "corpus.db")) as corpus:
+        assert corpus.ingest([first, second])["added"] == [first, second]
+        assert corpus.ingest([first, second])["unchanged"] == [first, second]
+        assert corpus.load(first) == sheet
+
+        col = sheet.get_column("MomSpeech")
+        value = col.cells[1].get_code("transcript")
+        df = corpus.query("MomSpeech", where={"transcript": value})
+        assert list(df["file"]) == [first, second]
+        assert list(df.columns) == ["file", "ordinal", "onset", "offset", "transcript"]
+
+        longer = [c for c in col.cells if c.offset - c.onset >= 2000 and "?" in c.get_code("transcript")]
+        df = corpus.query(
+            "MomSpeech", where={"transcript": lambda v: "?" in v}, min_duration=2000, files=[first]
+        )
+        assert list(df["onset"]) == sorted(c.onset for c in longer)
+
+        (path, found), = corpus.sheets("MomSpeech", during=(0, 12000), files=[second])
+        assert found.get_column("MomSpeech").cells == col.cells_in_range(0, 12000)
+
+        sheet.get_column("MomSpeech").remove_cell(col.cells[0])
+        pv.save_json(sheet, second)
+        os.utime(second, ns=(0, 0))
+        assert corpus.ingest([first, second])["updated"] == [second]
+        assert len(corpus.query("MomSpeech", files=[second])) == 19
+
+        os.remove(first)
+        assert corpus.prune() == [first]
+        assert corpus.paths() == [second]
+
+
+def test_profile(sample_spreadsheet, tmp_path):
+    events = []
+    with pv.profile(lambda *event: events.append(event)) as stats:
+        sheet = pv.load_opf(sample_spreadsheet)
+        sheet.to_df()
+        pv.save_json(sheet, str(tmp_path / "profiled.json"))
+    pv.load_json(str(tmp_path / "profiled.json"))
+
+    assert {"load", "parse", "cells", "merge", "to_df", "save"} <= stats.timers.keys()
+    assert stats.calls["load"] == 1
+    assert stats.counters["cells"] == 81
+    assert stats.counters["lines"] > 81
+    assert stats.counters["bytes"] > 0
+    assert stats.counters["intervals"] > 0
+    assert ("count", "cells", 20) in events
+    assert sum(v for kind, name, v in events if name == "load") == stats.timers["load"]
+
+
+def test_cell_at_matches_scan(sample_spreadsheet):
+    sheet = pv.load_opf(sample_spreadsheet)
+    for col in sheet.columns.values():
+        times = range(0, 140_000, 250)
+        for t in times:
+            expected = next((c for c in col.cells if c.spans(t)), None)
+            assert col.cell_at(t) is expected
+            expected = next((c for c in col.cells if c.in_range(t, t + 500)), None)
+            assert col.cell_in_range(t, t + 500) is expected
+        assert col.cells_at(times) == [col.cell_at(t) for t in times]
+
+
+def test_interval_index_tracks_edits():
+    col = Column("Test", "code")
+    first = col.new_cell("a", onset=0, offset=100)
+    second = col.new_cell("b", onset=200, offset=300)
+    assert col.cell_at(250) is second
+
+    second.change_code("onset", 50)
+    assert col.cell_at(75) is first
+    assert col.cells_in_range(60, 90) == [first, second]
+
+    col.remove_cell(first)
+    assert col.cell_at(75) is second
+    assert col.cell_at(10) is None
+
+    # Cells added after a query are indexed once, without a rebuild
+    index = col.index
+    third = col.new_cell("c", onset=400, offset=500)
+    assert col.index is index and len(index) == 2
+    assert col.cell_at(450) is third
+
+    # Direct edits of the cell list, even same-length ones, drop the index
+    other = Column("Test", "code").new_cell("d", onset=600, offset=700)
+    col.cells[1] = other
+    assert col.cell_at(450) is None
+    assert col.cell_at(650) is other
+    col.cells = [first, second]
+    assert col.cells_in_range(0, 1000) == [first, second]
+
+
+def test_merge_columns_outputs(sample_spreadsheet):
+    sheet = pv.load_opf(sample_spreadsheet)
+    merged = sheet.merge_columns("merged")
+    rows = sheet.merge_columns("merged", output="rows")
+    assert rows == [cell.get_values(intrinsics=True) for cell in merged.cells]
+
+    arrays = sheet.merge_columns("merged", output="arrays")
+    assert list(arrays) == ["ordinal", "onset", "offset"] + merged.codelist
+    assert list(arrays["onset"]) == [cell.onset for cell in merged.cells]
+
+
+def test_merge_columns_point_cells():
+    sheet = pv.Spreadsheet()
+    point = sheet.new_column("Point", "code")
+    point.new_cell("p", ordinal=1, onset=100, offset=100)
+    span = sheet.new_column("Span", "code")
+    span.new_cell("s", ordinal=1, onset=50, offset=99)
+
+    rows = sheet.merge_columns("merged", output="rows")
+    assert rows == [
+        [1, 50, 99, "", "", 1, "s"],
+        [2, 100, 100, 1, "p", "", ""],
+    ]
+    assert len(sheet.merge_columns("merged", prune=False).cells) == 3
+
+
+def test_array_backend_matches_cells(sample_spreadsheet, trimmed_sample_spreadsheet, onset, offset):
+    sheet = pv.load_opf(sample_spreadsheet)
+    array_sheet = pv.load_opf(get_resource("DatavyuSampleSpreadsheet.opf"), backend="arrays")
+
+    assert array_sheet == sheet
+    for name, col in sheet.columns.items():
+        array_col = array_sheet.get_column(name)
+        assert isinstance(array_col, ArrayColumn)
+        assert array_col._to_opfdb() == col._to_opfdb()
+        assert array_col._to_json() == col._to_json()
+        assert array_col.cell_at(40_000) == col.cell_at(40_000)
+    assert array_sheet.to_df().astype(object).equals(sheet.to_df().astype(object))
+
+    array_sheet.trim(onset, offset)
+    assert array_sheet == pv.load_opf(trimmed_sample_spreadsheet)
+
+
+def test_cell_slots():
+    col = Column("Test", "a", "b")
+    cell = col.new_cell("x", b="y", onset=0, offset=100)
+    assert not hasattr(cell, "__dict__")
+    assert cell.values == {"a": "x", "b": "y"}
+
+    cell.values["b"] = "z"
+    assert cell.get_code("b") == "z"
+    assert list(col.query({"b": "z"})) == [cell]
+    with pytest.raises(Exception):
+        cell.get_code("c")
+
+    other = Column("Other", "b", "a").new_cell("z", "x", onset=0, offset=100)
+    assert cell == other
+    other.change_code("a", "w")
+    assert cell != other
+
+
+def test_array_column_views():
+    col = ArrayColumn("Test", "code")
+    cell = col.new_cell("a", ordinal=1, onset=0, offset=100)
+    col.new_cell("a", ordinal=2, onset=200, offset=300)
+    assert col._vocab["code"] == ["", "a"]
+
+    cell.change_code("code", "b")
+    cell.change_code("offset", "00:00:00:250")
+    assert col.cell_at(150).get_values(intrinsics=True) == [1, 0, 250, "b"]
+    assert [c.ordinal for c in col.cells_in_range(210, 220)] == [1, 2]
+
+    col.remove_cell(cell)
+    assert col.cell_at(150) is None
+    assert len(col.cells) == 1
+
+    kept, = col.cells
+    col.cells = [Column("Other", "code").new_cell("c", ordinal=3, onset=400, offset=500)]
+    assert kept.get_values(intrinsics=True) == [2, 200, 300, "a"]
+    assert [c.get_values(intrinsics=True) for c in col.cells] == [[3, 400, 500, "c"]]
+    assert col.cell_at(250) is None and col.cell_at(450).get_code("code") == "c"
+
+
+def test_opf_escaped_values(tmp_path):
+    sheet = pv.Spreadsheet()
+    col = sheet.new_column("Speech", "text", "speaker")
+    col.new_cell("Well, yes", "mom", ordinal=1, onset=0, offset=1500)
+    col.new_cell("back\\slash", "", ordinal=2, onset=2000, offset=2500)
+
+    filename = str(tmp_path / "escaped.opf")
+    pv.save_opf(sheet, filename)
+    loaded = pv.load_opf(filename)
+    assert [c.get_values() for c in loaded.get_column("Speech").cells] == [
+        ["Well, yes", "mom"],
+        ["back\\slash", ""],
+    ]
+
+
+def test_split_values():
+    assert pv.pyvyu._split_values("a,b,") == ["a", "b", ""]
+    assert pv.pyvyu._split_values("a\\,b,c") == ["a,b", "c"]
+    assert pv.pyvyu._split_values('"a, b",c') == ['"a, b"', "c"]
+    assert pv.pyvyu._split_values('x,"a\\, b"') == ["x", '"a, b"']
+    assert pv.pyvyu._split_values('say "hi, there,b') == ['say "hi', " there", "b"]
+    assert pv.pyvyu._split_values('"open,b') == ['"open', "b"]
+
+
+@pytest.mark.parametrize("executor", ["process", "thread"])
+def test_load_many(executor, tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"sheet{i}.opf"
+        path.write_bytes(get_resource("DatavyuSampleSpreadsheet.opf").read())
+        paths.append(str(path))
+    bad = tmp_path / "bad.opf"
+    bad.write_text("not a zip file")
+
+    errors = {}
+    sheets = pv.load_many(
+        paths + [str(bad)],
+        workers=2,
+        executor=executor,
+        on_error=lambda path, exc: errors.setdefault(path, exc),
+    )
+    assert list(sheets) == paths
+    assert list(errors) == [str(bad)]
+    assert sheets[paths[0]] == pv.load_opf(paths[0])
+
+    df = pv.load_many(paths, workers=2, executor=executor, columns=["MomSpeech"], as_df=True)
+    assert df.index.names == ["file", "ordinal"]
+    assert len(df.loc[paths[1]]) == 20
+    assert list(df.index.get_level_values("file").unique()) == paths
+
+
+def test_sheet_cache(tmp_path):
+    filename = str(tmp_path / "sample.opf")
+    with open(filename, "wb") as f:
+        f.write(get_resource("DatavyuSampleSpreadsheet.opf").read())
+    sheet = pv.load_opf(filename)
+
+    cache = pv.enable_cache(str(tmp_path / "cache"), key="content")
+    try:
+        assert pv.load_opf(filename) == sheet
+        assert pv.load_opf(filename, backend="arrays") == sheet
+        assert pv.load_opf(filename, columns=["MomSpeech"]).get_column_list() == ["MomSpeech"]
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 1, 1)
+
+        cache.max_bytes = 0
+        pv.load_json(_save_json_copy(sheet, tmp_path))
+        assert cache.stats()["entries"] == 0
+        assert cache.evictions == 2
+    finally:
+        pv.disable_cache()
+
+
+def _save_json_copy(sheet, tmp_path):
+    filename = str(tmp_path / "sample.json")
+    pv.save_json(sheet, filename)
+    return filename
+
+
+@pytest.mark.parametrize("raw_copy", [True, False])
+def test_save_opf_existing(raw_copy, sample_spreadsheet, tmp_path, monkeypatch):
+    monkeypatch.setattr(pv.pyvyu, "_RAW_COPY", raw_copy and pv.pyvyu._RAW_COPY)
+    filename = str(tmp_path / "sample.opf")
+    with open(filename, "wb") as f:
+        f.write(sample_spreadsheet.read())
+    with zipfile.ZipFile(filename, "a", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("notes.txt", "keep me " * 100)
+
+    sheet = pv.load_opf(filename)
+    sheet.get_column("MomSpeech").cells[0].change_code("transcript", "edited")
+    pv.save_opf(sheet, filename)
+
+    assert os.listdir(str(tmp_path)) == ["sample.opf"]
+    with zipfile.ZipFile(filename) as zf:
+        assert zf.testzip() is None
+        assert [i.filename for i in zf.infolist()] == ["project", "1", "notes.txt", "db"]
+        assert zf.read("notes.txt") == b"keep me " * 100
+        assert zf.getinfo("notes.txt").compress_type == zipfile.ZIP_DEFLATED
+        assert zf.read("db").decode("utf8") == "#4\n" + sheet._to_opfdb()
+    assert pv.load_opf(filename) == sheet
+
+
+def test_save_opf_mode(sample_spreadsheet, tmp_path):
+    sheet = pv.load_opf(sample_spreadsheet)
+    filename = str(tmp_path / "sample.opf")
+    umask = os.umask(0o022)
+    try:
+        pv.save_opf(sheet, filename)
+        assert os.stat(filename).st_mode & 0o777 == 0o644
+        os.chmod(filename, 0o640)
+        pv.save_opf(sheet, filename)
+        assert os.stat(filename).st_mode & 0o777 == 0o640
+    finally:
+        os.umask(umask)
+
+
+def test_save_opf_zip64(sample_spreadsheet, tmp_path, monkeypatch):
+    sheet = pv.load_opf(sample_spreadsheet)
+    filename = str(tmp_path / "sample.opf")
+    monkeypatch.setattr(zipfile, "ZIP64_LIMIT", 1000)
+    pv.save_opf(sheet, filename)
+    monkeypatch.undo()
+    with zipfile.ZipFile(filename) as zf:
+        assert zf.getinfo("db").file_size > 1000
+    assert pv.load_opf(filename) == sheet
+
+
 @pytest.mark.skip
 def test_df_to_csv(sample_spreadsheet):
     sheet = pv.load_opf(sample_spreadsheet)
@@ -141,3 +879,22 @@ def test_to_millis(rsrc_millis, rsrc_timestamps):
 def test_to_timestamp(rsrc_millis, rsrc_timestamps):
     for m, t in zip(rsrc_millis, rsrc_timestamps):
         assert t == pv.to_timestamp(m)
+
+
+def test_timestamp_arrays(rsrc_millis, rsrc_timestamps):
+    assert list(pv.to_millis(rsrc_timestamps)) == rsrc_millis
+    assert list(pv.to_millis(pd.Series(rsrc_timestamps))) == rsrc_millis
+    assert list(pv.to_millis(np.array(rsrc_millis))) == rsrc_millis
+    assert list(pv.to_timestamp(rsrc_millis)) == rsrc_timestamps
+    assert list(pv.to_timestamp(np.array(rsrc_millis))) == rsrc_timestamps
+    assert list(pv.to_millis(["100:00:00:000", "1:2:3:4"])) == [360_000_000, 3_723_004]
+
+
+def test_timestamp_cache(rsrc_millis, rsrc_timestamps):
+    pv.set_timestamp_cache(16)
+    try:
+        for m, t in zip(rsrc_millis * 2, rsrc_timestamps * 2):
+            assert m == pv.to_millis(t)
+            assert t == pv.to_timestamp(m)
+    finally:
+        pv.set_timestamp_cache(0)